@@ -1,78 +1,98 @@
+from grid_pipeline import GridPipeline
+from grid_placement import is_grid_item
+
+# Properties moved from a grid item's style into its grid dict
+SELF_ALIGNMENT_PROPS = ("justify-self", "align-self")
+
+
+def _is_grid_container(styles):
+    return styles.get("display") in ("grid", "inline-grid")
+
+
+def _split_place_shorthand(prop_value):
+    values = prop_value.strip().split()
+    if len(values) == 1:
+        return values[0], values[0]
+    elif len(values) == 2:
+        return values[0], values[1]
+    return "start", "start"
+
+
+def _validate_value(prop, value):
+    valid_values = {
+        "justify-items": ["start", "end", "center", "stretch"],
+        "align-items": ["start", "end", "center", "stretch", "baseline"],
+        "justify-content": ["start", "end", "center", "stretch", "space-around", "space-between", "space-evenly"],
+        "align-content": ["start", "end", "center", "stretch", "space-around", "space-between", "space-evenly"],
+        "justify-self": ["start", "end", "center", "stretch", "auto"],
+        "align-self": ["start", "end", "center", "stretch", "baseline", "auto"]
+    }
+    return value in valid_values.get(prop, [])
+
+
+def align_grid_node(element, parent_state=None):
+    """
+    Grid pass: applies the alignment algorithm to a single node and its
+    direct children's self-alignment, without descending further.
+    """
+    styles = element.get("grid", {})
+
+    if not _is_grid_container(styles):
+        return None
+    _align_container(styles, element.get("component", []))
+    return None
+
+
+def align_grid_flat(flat):
+    """Alignment pass over a FlatDOM: every container and its direct children"""
+    fields = flat.fields
+    for index in flat.containers():
+        _align_container(fields[index]["grid"], [fields[child] for child in flat.children(index)])
+
+
+def _align_container(styles, children):
+    """Alignment of one container's grid dict and its children's self-alignment"""
+    place_items = styles.pop("place-items", None)
+    place_content = styles.pop("place-content", None)
+
+    if place_items:
+        align_items, justify_items = _split_place_shorthand(place_items)
+        styles["align-items"] = align_items
+        styles["justify-items"] = justify_items
+
+    if place_content:
+        align_content, justify_content = _split_place_shorthand(place_content)
+        styles["align-content"] = align_content
+        styles["justify-content"] = justify_content
+
+    for prop in ["justify-items", "align-items", "justify-content", "align-content"]:
+        if prop in styles and not _validate_value(prop, styles[prop]):
+            styles[prop] = "start"
+
+    for child in children:
+        if not is_grid_item(child):
+            continue
+
+        child_styles = child.setdefault("grid", {})
+        child_style = child.get("style", {})
+
+        for prop in SELF_ALIGNMENT_PROPS:
+            if prop in child_style:
+                value = child_style[prop]
+                if _validate_value(prop, value):
+                    child_styles[prop] = value
+                    child_style.pop(prop, None)
+
+        for prop in SELF_ALIGNMENT_PROPS:
+            if prop in child_styles:
+                if not _validate_value(prop, child_styles[prop]):
+                    child_styles[prop] = "auto"
+            else:
+                child_styles.pop(prop, None)
+
+
 def process_grid_alignment(dom_tree):
     """
     Processes the grid alignment of the DOM tree based on the algorithm provided.
     """
-    def is_grid_container(styles):
-        return styles.get("display") in ("grid", "inline-grid")
-
-    def split_place_shorthand(prop_value):
-        values = prop_value.strip().split()
-        if len(values) == 1:
-            return values[0], values[0]
-        elif len(values) == 2:
-            return values[0], values[1]
-        return "start", "start"
-
-    def validate_value(prop, value):
-        valid_values = {
-            "justify-items": ["start", "end", "center", "stretch"],
-            "align-items": ["start", "end", "center", "stretch", "baseline"],
-            "justify-content": ["start", "end", "center", "stretch", "space-around", "space-between", "space-evenly"],
-            "align-content": ["start", "end", "center", "stretch", "space-around", "space-between", "space-evenly"],
-            "justify-self": ["start", "end", "center", "stretch", "auto"],
-            "align-self": ["start", "end", "center", "stretch", "baseline", "auto"]
-        }
-        return value in valid_values.get(prop, [])
-
-    def process_element(element):
-        styles = element.get("grid", {})
-        element_style = element.get("style", {})
-
-        if not is_grid_container(styles):
-            for child in element.get("component", []):
-                if isinstance(child, dict):
-                    process_element(child)
-            return
-
-        place_items = styles.pop("place-items", None)
-        place_content = styles.pop("place-content", None)
-
-        if place_items:
-            align_items, justify_items = split_place_shorthand(place_items)
-            styles["align-items"] = align_items
-            styles["justify-items"] = justify_items
-
-        if place_content:
-            align_content, justify_content = split_place_shorthand(place_content)
-            styles["align-content"] = align_content
-            styles["justify-content"] = justify_content
-
-        for prop in ["justify-items", "align-items", "justify-content", "align-content"]:
-            if prop in styles and not validate_value(prop, styles[prop]):
-                styles[prop] = "start"
-
-        for child in element.get("component", []):
-            if not isinstance(child, dict):
-                continue
-
-            child_styles = child.setdefault("grid", {})
-            child_style = child.get("style", {})
-
-            for prop in ["justify-self", "align-self"]:
-                if prop in child_style:
-                    value = child_style[prop]
-                    if validate_value(prop, value):
-                        child_styles[prop] = value
-                        child_style.pop(prop, None)
-
-            for prop in ["justify-self", "align-self"]:
-                if prop in child_styles:
-                    if not validate_value(prop, child_styles[prop]):
-                        child_styles[prop] = "auto"
-                else:
-                    child_styles.pop(prop, None)
-
-            process_element(child)
-
-    process_element(dom_tree)
-    return dom_tree
+    return GridPipeline([align_grid_node]).run(dom_tree)
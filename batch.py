@@ -0,0 +1,237 @@
+# batch.py
+"""
+Batch HTML/CSS -> grid JSON conversion across a process pool.
+
+Jobs come from a manifest (a JSON list of {"html", "css", "output"} objects)
+or from a glob of HTML files that share one stylesheet, or each use the .css
+file next to them. Failures are reported per file and do not stop the batch.
+With --cache-dir, results are looked up in and stored to a ResultCache, and
+auto_ names are seeded so repeated inputs give identical outputs. With
+--stylesheet-cache, compiled stylesheets are persisted between runs.
+
+    python batch.py --glob "forms/*.html" --css shared.css --out-dir out
+    python batch.py --manifest jobs.json --workers 8 --chunksize 32
+    python batch.py --manifest jobs.json --cache-dir .convert-cache
+    python batch.py --glob "forms/*.html" --css shared.css --stylesheet-cache .css-cache
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from dom_linegap import CSSParser, convert_document, open_mapped
+from node_names import NAMING_SCHEMES
+from result_cache import DEFAULT_MAX_BYTES, ResultCache, cached_convert
+from stylesheet_cache import load_stylesheet_file
+from traversal import dump_json
+
+# Compiled stylesheets and CSS file contents kept per worker process
+WORKER_STYLESHEETS = 32
+
+# Compiled stylesheets, per worker process, keyed by CSS path
+_stylesheet_cache = {}
+# CSS file contents, per worker process, keyed by CSS path
+_css_bytes_cache = {}
+# Worker's ResultCache, set by _init_worker when caching is enabled
+_result_cache = None
+# Directory of persisted compiled stylesheets, set by _init_worker
+_stylesheet_dir = None
+# Naming scheme for auto_ names, set by _init_worker
+_names = None
+
+
+def _init_worker(cache_dir, cache_bytes, stylesheet_dir=None, names=None):
+    global _result_cache, _stylesheet_dir, _names
+    _result_cache = ResultCache(cache_dir, cache_bytes) if cache_dir else None
+    _stylesheet_dir = stylesheet_dir
+    _names = names
+
+
+def _load_stylesheet(css_file):
+    stylesheet = _stylesheet_cache.pop(css_file, None)
+    if stylesheet is None:
+        if _stylesheet_dir:
+            stylesheet = load_stylesheet_file(css_file, _stylesheet_dir)[0]
+        else:
+            with open(css_file, "r", encoding="utf-8") as f:
+                stylesheet = CSSParser(f.read()).compile()
+        if len(_stylesheet_cache) >= WORKER_STYLESHEETS:
+            del _stylesheet_cache[next(iter(_stylesheet_cache))]
+    _stylesheet_cache[css_file] = stylesheet  # most recently used last
+    return stylesheet
+
+
+def _load_css_bytes(css_file):
+    css_bytes = _css_bytes_cache.pop(css_file, None)
+    if css_bytes is None:
+        with open(css_file, "rb") as f:
+            css_bytes = f.read()
+        if len(_css_bytes_cache) >= WORKER_STYLESHEETS:
+            del _css_bytes_cache[next(iter(_css_bytes_cache))]
+    _css_bytes_cache[css_file] = css_bytes  # most recently used last
+    return css_bytes
+
+
+def convert_job(job):
+    """
+    Convert one {"html", "css", "output"} job and write its output file.
+    Never raises: the returned result carries either the HTML validation
+    warnings or the error that stopped this file.
+    """
+    result = {"html": job["html"], "output": job["output"], "ok": False,
+              "warnings": [], "error": None, "cached": False}
+    try:
+        if _result_cache is not None:
+            with open_mapped(job["html"]) as html_bytes:
+                output_text, errors, result["cached"] = cached_convert(
+                    html_bytes, _load_css_bytes(job["css"]), _result_cache,
+                    stylesheet=lambda: _load_stylesheet(job["css"]), names=_names)
+            with open(job["output"], "w", encoding="utf-8") as f:
+                f.write(output_text)
+        else:
+            stylesheet = _load_stylesheet(job["css"])
+            with open_mapped(job["html"]) as html:
+                output, errors = convert_document(html, stylesheet, names=_names)
+            with open(job["output"], "w", encoding="utf-8") as f:
+                dump_json(output, f, indent=2)
+        result["warnings"] = errors
+        result["ok"] = True
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def load_manifest(manifest_file):
+    """Read a JSON list of {"html", "css", "output"} jobs"""
+    with open(manifest_file, "r", encoding="utf-8") as f:
+        jobs = json.load(f)
+    if not isinstance(jobs, list):
+        raise ValueError("Manifest must be a JSON list of jobs")
+    for job in jobs:
+        missing = {"html", "css", "output"} - set(job)
+        if missing:
+            raise ValueError(f"Manifest job {job!r} is missing {', '.join(sorted(missing))}")
+    return jobs
+
+
+def jobs_from_glob(pattern, css_file=None, out_dir=None):
+    """
+    Build jobs for every HTML file matching pattern. Without css_file each
+    document uses the .css file with the same stem; outputs go next to the
+    input with a .json extension, or into out_dir at the same path relative
+    to the glob root (the pattern's leading directories without wildcards),
+    so "forms/**/*.html" writes forms/a/x.html to out_dir/a/x.json.
+    """
+    jobs = []
+    root = _glob_root(pattern)
+    for html_file in sorted(glob.glob(pattern, recursive=True)):
+        stem = os.path.splitext(html_file)[0]
+        output = stem + ".json"
+        if out_dir:
+            output = os.path.join(out_dir, os.path.relpath(output, root))
+        jobs.append({"html": html_file, "css": css_file or stem + ".css", "output": output})
+    return jobs
+
+
+def _glob_root(pattern):
+    """Leading directories of pattern that contain no wildcards"""
+    root = os.path.dirname(pattern)
+    while glob.has_magic(root):
+        root = os.path.dirname(root)
+    return root or os.curdir
+
+
+def prepare_outputs(jobs):
+    """
+    Check that no two jobs write the same output file and create the
+    missing output directories. Raises ValueError on a collision.
+    """
+    seen = {}
+    for job in jobs:
+        output = os.path.normcase(os.path.abspath(job["output"]))
+        if output in seen:
+            raise ValueError(f"{seen[output]} and {job['html']} would both be written to "
+                             f"{job['output']}")
+        seen[output] = job["html"]
+    for directory in {os.path.dirname(output) for output in seen}:
+        os.makedirs(directory, exist_ok=True)
+
+
+def run_batch(jobs, workers=None, chunksize=16, cache_dir=None, cache_bytes=DEFAULT_MAX_BYTES,
+              stylesheet_dir=None, names=None):
+    """
+    Convert all jobs on a pool of worker processes.
+
+    Args:
+        jobs: List of {"html", "css", "output"} dicts
+        workers: Number of worker processes (default: CPU count); 1 runs
+                 the jobs in this process
+        chunksize: Jobs handed to a worker at a time
+        cache_dir: Directory of a ResultCache shared by the workers, or None
+        cache_bytes: Size bound of that cache
+        stylesheet_dir: Directory of persisted compiled stylesheets, or None
+        names: Naming scheme for auto_ names (see node_names)
+
+    Returns:
+        list: One result dict per job, in job order
+
+    Call prepare_outputs(jobs) first unless the output directories exist
+    and the outputs are known to be distinct.
+    """
+    if workers == 1:
+        _init_worker(cache_dir, cache_bytes, stylesheet_dir, names)
+        return [convert_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(cache_dir, cache_bytes, stylesheet_dir, names)) as executor:
+        return list(executor.map(convert_job, jobs, chunksize=max(1, chunksize)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert HTML/CSS pairs to grid JSON in parallel")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--manifest", help="JSON list of {html, css, output} jobs")
+    source.add_argument("--glob", help="Glob of HTML files to convert")
+    parser.add_argument("--css", help="Stylesheet shared by all --glob documents")
+    parser.add_argument("--out-dir", help="Directory for --glob outputs")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunksize", type=int, default=16, help="Jobs per worker dispatch")
+    parser.add_argument("--cache-dir", help="Reuse results from this content-addressed cache")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="Cache size bound in MiB")
+    parser.add_argument("--stylesheet-cache", help="Persist compiled stylesheets in this directory")
+    parser.add_argument("--names", choices=NAMING_SCHEMES, default=None,
+                        help="Naming scheme for nodes without an id, value or name")
+    args = parser.parse_args(argv)
+
+    if args.manifest:
+        jobs = load_manifest(args.manifest)
+    else:
+        jobs = jobs_from_glob(args.glob, args.css, args.out_dir)
+    try:
+        prepare_outputs(jobs)
+    except ValueError as e:
+        parser.error(str(e))
+
+    start = time.perf_counter()
+    results = run_batch(jobs, args.workers, args.chunksize,
+                        args.cache_dir, args.cache_size * 1024 * 1024, args.stylesheet_cache,
+                        args.names)
+    elapsed = time.perf_counter() - start
+
+    failures = [r for r in results if not r["ok"]]
+    for result in results:
+        if result["warnings"]:
+            print(f"{result['html']}: {len(result['warnings'])} HTML validation warning(s)")
+    for result in failures:
+        print(f"FAILED {result['html']}: {result['error']}")
+    cached = sum(1 for r in results if r["cached"])
+    print(f"Converted {len(results) - len(failures)}/{len(results)} files "
+          f"({cached} from cache) in {elapsed:.2f}s")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
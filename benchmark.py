@@ -0,0 +1,297 @@
+# benchmark.py
+"""
+Benchmarks for the HTML/CSS -> grid JSON pipeline on synthetic documents.
+
+A seeded generator builds HTML and CSS of a chosen shape; every pipeline
+stage is timed separately over a range of document sizes, reporting
+throughput, the scaling curve and peak memory. Results can be saved as a
+baseline and later runs compared against it.
+
+    python benchmark.py --sizes 1000 4000 16000 --save-baseline bench_baseline.json
+    python benchmark.py --sizes 1000 4000 16000 --baseline bench_baseline.json
+"""
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from dom_linegap import CSSParser, HTMLParser
+from grid_detector import process_grid_containers
+from position import process_grid_positions
+
+STAGES = ["html_parse", "css_parse", "apply_styles", "to_json",
+          "process_grid_containers", "process_grid_positions"]
+
+TAGS = ["div", "section", "p", "span", "label", "a", "ul", "li"]
+INPUT_TYPES = ["text", "checkbox", "radio", "email", "date", "password"]
+LENGTHS = ["4px", "8px", "12px", "0.5em", "1em", "1.5rem", "2rem"]
+COLORS = ["red", "navy", "#333", "#1a2b3c", "rgb(10, 20, 30)", "rgba(0, 0, 0, 0.5)",
+          "hsl(210, 50%, 40%)"]
+TEMPLATES = ["1fr 1fr", "repeat(3, 1fr)", "100px 1fr 2fr", "repeat(4, minmax(50px, 1fr))"]
+ALIGNMENTS = ["start", "end", "center", "stretch"]
+
+
+def tree_capacity(depth, fanout):
+    """Most elements a generated tree of this depth and fanout can hold"""
+    return sum(fanout ** level for level in range(depth + 1))
+
+
+def generate_document(nodes=1000, depth=8, fanout=6, selectors=200, grid_ratio=0.1,
+                      shorthand_ratio=0.5, classes=50, numeric_ids=False, seed=0):
+    """
+    Build a synthetic (html, css) pair.
+
+    Args:
+        nodes: Number of elements under <body>
+        depth: Maximum nesting depth
+        fanout: Maximum children per element
+        selectors: Number of CSS rules
+        grid_ratio: Share of elements (and rules) that are grid containers
+        shorthand_ratio: Share of grid rules using place-*/gap/grid-template
+                         shorthands instead of longhands
+        classes: Size of the class-name vocabulary
+        numeric_ids: Use ids like "12" (parsed to numbers) instead of "n12"
+        seed: Random seed; the same arguments always give the same output
+    """
+    capacity = tree_capacity(depth, fanout)
+    if nodes > capacity:
+        raise ValueError(f"{nodes} nodes do not fit in a tree of depth {depth} and fanout "
+                         f"{fanout} (at most {capacity})")
+    rng = random.Random(seed)
+    id_prefix = "" if numeric_ids else "n"
+
+    # Tree shape: attach each element to a random open parent
+    parents = [-1]
+    node_depth = [0]
+    child_count = [0]
+    open_nodes = [0]
+    for index in range(1, nodes):
+        while True:
+            slot = rng.randrange(len(open_nodes))
+            parent = open_nodes[slot]
+            if child_count[parent] < fanout:
+                break
+            open_nodes[slot] = open_nodes[-1]
+            open_nodes.pop()
+        parents.append(parent)
+        node_depth.append(node_depth[parent] + 1)
+        child_count.append(0)
+        child_count[parent] += 1
+        if node_depth[index] < depth:
+            open_nodes.append(index)
+
+    children = [[] for _ in range(nodes)]
+    for index in range(1, nodes):
+        children[parents[index]].append(index)
+
+    def open_tag(index):
+        if not children[index] and rng.random() < 0.3:
+            input_type = rng.choice(INPUT_TYPES)
+            return f'<input type="{input_type}" name="field{index}">', None
+        tag = rng.choice(TAGS)
+        attrs = [f'class="c{rng.randrange(classes)} c{rng.randrange(classes)}"']
+        if rng.random() < 0.1:
+            attrs.append(f'id="{id_prefix}{index}"')
+        if rng.random() < grid_ratio:
+            attrs[0] = attrs[0][:-1] + ' grid"'
+        return f"<{tag} {' '.join(attrs)}>", tag
+
+    lines = ["<html>", "<body>"]
+    stack = [(0, None)]
+    while stack:
+        index, closing = stack.pop()
+        if closing is not None:
+            lines.append(closing)
+            continue
+        tag_html, tag = open_tag(index)
+        lines.append(tag_html)
+        if tag is None:
+            continue
+        if rng.random() < 0.3:
+            lines.append(f"Text {index}")
+        if rng.random() < 0.05:
+            lines.append("")
+        stack.append((index, f"</{tag}>"))
+        stack.extend((child, None) for child in reversed(children[index]))
+    lines.extend(["</body>", "</html>"])
+    html = "\n".join(lines)
+
+    rules = []
+    for _ in range(selectors):
+        kind = rng.random()
+        if kind < 0.5:
+            selector = f".c{rng.randrange(classes)}"
+        elif kind < 0.7:
+            selector = rng.choice(TAGS)
+        elif kind < 0.8:
+            selector = f"#{id_prefix}{rng.randrange(nodes)}"
+        elif kind < 0.9:
+            selector = f"{rng.choice(TAGS)} .c{rng.randrange(classes)}"
+        else:
+            selector = f"input[type=\"{rng.choice(INPUT_TYPES)}\"]"
+
+        declarations = [f"margin: {rng.choice(LENGTHS)} {rng.choice(LENGTHS)}",
+                        f"color: {rng.choice(COLORS)}"]
+        if rng.random() < 0.3:
+            declarations.append(f"border: 1px solid {rng.choice(COLORS)}")
+        if rng.random() < 0.3:
+            declarations.append(f"background: {rng.choice(COLORS)}")
+        if rng.random() < grid_ratio:
+            selector = rng.choice([".grid", f"{rng.choice(TAGS)} .grid"])
+            declarations.append("display: grid")
+            if rng.random() < shorthand_ratio:
+                declarations.append(f"grid-template: auto / {rng.choice(TEMPLATES)}")
+                declarations.append(f"gap: {rng.choice(LENGTHS)} {rng.choice(LENGTHS)}")
+                declarations.append(f"place-items: {rng.choice(ALIGNMENTS)} {rng.choice(ALIGNMENTS)}")
+            else:
+                declarations.append(f"grid-template-columns: {rng.choice(TEMPLATES)}")
+                declarations.append(f"grid-row-gap: {rng.choice(LENGTHS)}")
+                declarations.append(f"align-items: {rng.choice(ALIGNMENTS)}")
+        rules.append(f"{selector} {{\n  " + ";\n  ".join(declarations) + ";\n}")
+    css = "\n\n".join(rules)
+    return html, css
+
+
+def _run_stages(html, css, measure):
+    """Run every stage once, timing each with measure(stage, fn)"""
+    dom = measure("html_parse", lambda: HTMLParser(html).parse())
+    css_rules = measure("css_parse", lambda: CSSParser(css).parse())
+    measure("apply_styles", lambda: dom.apply_styles(css_rules))
+    body = next(child for child in dom.children if child.tag == "body")
+    tree = measure("to_json", body.to_json)
+    measure("process_grid_positions", lambda: process_grid_positions(tree))
+    measure("process_grid_containers", lambda: process_grid_containers(tree))
+
+
+def benchmark_size(nodes, repeat=3, **generator_args):
+    """Time every stage on one generated document; best of `repeat` runs"""
+    html, css = generate_document(nodes=nodes, **generator_args)
+    times = {stage: float("inf") for stage in STAGES}
+
+    def timed(stage, fn):
+        start = time.perf_counter()
+        result = fn()
+        times[stage] = min(times[stage], time.perf_counter() - start)
+        return result
+
+    for _ in range(repeat):
+        gc.collect()
+        _run_stages(html, css, timed)
+
+    peak_memory = {}
+
+    def traced(stage, fn):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        result = fn()
+        peak_memory[stage] = tracemalloc.get_traced_memory()[1] - before
+        return result
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        _run_stages(html, css, traced)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        stage: {
+            "seconds": times[stage],
+            "nodes_per_second": nodes / times[stage] if times[stage] else None,
+            "peak_bytes": peak_memory[stage],
+        }
+        for stage in STAGES
+    }
+
+
+def run_benchmarks(sizes, repeat=3, **generator_args):
+    return {
+        "generator": generator_args,
+        "results": {str(size): benchmark_size(size, repeat, **generator_args) for size in sizes},
+    }
+
+
+def print_report(report, baseline=None, threshold=0.10):
+    """
+    Print one row per size and stage. With a baseline, show the time ratio
+    against it and return the (size, stage) pairs slower by more than
+    threshold.
+    """
+    regressions = []
+    print(f"{'nodes':>8} {'stage':<24} {'ms':>10} {'nodes/s':>12} {'peak KiB':>10}"
+          + (f" {'vs base':>8}" if baseline else ""))
+    for size, stages in report["results"].items():
+        for stage in STAGES:
+            entry = stages[stage]
+            line = (f"{size:>8} {stage:<24} {entry['seconds'] * 1000:>10.2f} "
+                    f"{entry['nodes_per_second'] or 0:>12.0f} {entry['peak_bytes'] / 1024:>10.1f}")
+            base = (baseline or {}).get("results", {}).get(size, {}).get(stage)
+            if base:
+                ratio = entry["seconds"] / base["seconds"]
+                line += f" {ratio:>7.2f}x"
+                if ratio > 1 + threshold:
+                    regressions.append((size, stage))
+                    line += "  REGRESSION"
+            print(line)
+
+    # Scaling: time growth relative to node growth between successive sizes
+    sizes = list(report["results"])
+    if len(sizes) > 1:
+        print("\nScaling (time ratio / size ratio, ~1.0 is linear):")
+        for stage in STAGES:
+            steps = []
+            for small, large in zip(sizes, sizes[1:]):
+                t_small = report["results"][small][stage]["seconds"]
+                t_large = report["results"][large][stage]["seconds"]
+                if t_small:
+                    steps.append(f"{(t_large / t_small) / (int(large) / int(small)):.2f}")
+            print(f"  {stage:<24} {' '.join(steps)}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the conversion pipeline")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 4000, 16000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--depth", type=int, default=8)
+    parser.add_argument("--fanout", type=int, default=6)
+    parser.add_argument("--selectors", type=int, default=200)
+    parser.add_argument("--grid-ratio", type=float, default=0.1)
+    parser.add_argument("--shorthand-ratio", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", help="Compare against a saved report")
+    parser.add_argument("--save-baseline", help="Write this run's report as a baseline")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Slowdown against the baseline counted as a regression")
+    args = parser.parse_args(argv)
+    capacity = tree_capacity(args.depth, args.fanout)
+    if max(args.sizes) > capacity:
+        parser.error(f"--sizes {max(args.sizes)} does not fit in a tree of --depth {args.depth} "
+                     f"and --fanout {args.fanout} (at most {capacity} nodes)")
+
+    report = run_benchmarks(
+        args.sizes, args.repeat, depth=args.depth, fanout=args.fanout,
+        selectors=args.selectors, grid_ratio=args.grid_ratio,
+        shorthand_ratio=args.shorthand_ratio, seed=args.seed)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("generator") != report["generator"]:
+            print("Warning: baseline was recorded with different generator settings")
+
+    regressions = print_report(report, baseline, args.threshold)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {args.save_baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+# colors.py
+"""
+CSS colour resolution for the style pipeline.
+
+Named colours come from a built-in table and parsed values are memoized in a
+bounded LRU cache, so repeated values in a stylesheet are resolved once and
+no exceptions are used for control flow on the hot path.
+"""
+import colorsys
+import re
+from functools import lru_cache
+
+FALLBACK_COLOR = "#ff0000"
+COLOR_CACHE_SIZE = 4096
+HEX_DIGITS = frozenset("0123456789abcdef")
+INT_RE = re.compile(r"[+-]?[0-9]+")
+
+# CSS Color Module Level 4 named colours
+NAMED_COLORS = {
+    "aliceblue": "#f0f8ff", "antiquewhite": "#faebd7", "aqua": "#00ffff",
+    "aquamarine": "#7fffd4", "azure": "#f0ffff", "beige": "#f5f5dc",
+    "bisque": "#ffe4c4", "black": "#000000", "blanchedalmond": "#ffebcd",
+    "blue": "#0000ff", "blueviolet": "#8a2be2", "brown": "#a52a2a",
+    "burlywood": "#deb887", "cadetblue": "#5f9ea0", "chartreuse": "#7fff00",
+    "chocolate": "#d2691e", "coral": "#ff7f50", "cornflowerblue": "#6495ed",
+    "cornsilk": "#fff8dc", "crimson": "#dc143c", "cyan": "#00ffff",
+    "darkblue": "#00008b", "darkcyan": "#008b8b", "darkgoldenrod": "#b8860b",
+    "darkgray": "#a9a9a9", "darkgreen": "#006400", "darkgrey": "#a9a9a9",
+    "darkkhaki": "#bdb76b", "darkmagenta": "#8b008b",
+    "darkolivegreen": "#556b2f", "darkorange": "#ff8c00",
+    "darkorchid": "#9932cc", "darkred": "#8b0000", "darksalmon": "#e9967a",
+    "darkseagreen": "#8fbc8f", "darkslateblue": "#483d8b",
+    "darkslategray": "#2f4f4f", "darkslategrey": "#2f4f4f",
+    "darkturquoise": "#00ced1", "darkviolet": "#9400d3", "deeppink": "#ff1493",
+    "deepskyblue": "#00bfff", "dimgray": "#696969", "dimgrey": "#696969",
+    "dodgerblue": "#1e90ff", "firebrick": "#b22222", "floralwhite": "#fffaf0",
+    "forestgreen": "#228b22", "fuchsia": "#ff00ff", "gainsboro": "#dcdcdc",
+    "ghostwhite": "#f8f8ff", "gold": "#ffd700", "goldenrod": "#daa520",
+    "gray": "#808080", "green": "#008000", "greenyellow": "#adff2f",
+    "grey": "#808080", "honeydew": "#f0fff0", "hotpink": "#ff69b4",
+    "indianred": "#cd5c5c", "indigo": "#4b0082", "ivory": "#fffff0",
+    "khaki": "#f0e68c", "lavender": "#e6e6fa", "lavenderblush": "#fff0f5",
+    "lawngreen": "#7cfc00", "lemonchiffon": "#fffacd", "lightblue": "#add8e6",
+    "lightcoral": "#f08080", "lightcyan": "#e0ffff",
+    "lightgoldenrodyellow": "#fafad2", "lightgray": "#d3d3d3",
+    "lightgreen": "#90ee90", "lightgrey": "#d3d3d3", "lightpink": "#ffb6c1",
+    "lightsalmon": "#ffa07a", "lightseagreen": "#20b2aa",
+    "lightskyblue": "#87cefa", "lightslategray": "#778899",
+    "lightslategrey": "#778899", "lightsteelblue": "#b0c4de",
+    "lightyellow": "#ffffe0", "lime": "#00ff00", "limegreen": "#32cd32",
+    "linen": "#faf0e6", "magenta": "#ff00ff", "maroon": "#800000",
+    "mediumaquamarine": "#66cdaa", "mediumblue": "#0000cd",
+    "mediumorchid": "#ba55d3", "mediumpurple": "#9370db",
+    "mediumseagreen": "#3cb371", "mediumslateblue": "#7b68ee",
+    "mediumspringgreen": "#00fa9a", "mediumturquoise": "#48d1cc",
+    "mediumvioletred": "#c71585", "midnightblue": "#191970",
+    "mintcream": "#f5fffa", "mistyrose": "#ffe4e1", "moccasin": "#ffe4b5",
+    "navajowhite": "#ffdead", "navy": "#000080", "oldlace": "#fdf5e6",
+    "olive": "#808000", "olivedrab": "#6b8e23", "orange": "#ffa500",
+    "orangered": "#ff4500", "orchid": "#da70d6", "palegoldenrod": "#eee8aa",
+    "palegreen": "#98fb98", "paleturquoise": "#afeeee",
+    "palevioletred": "#db7093", "papayawhip": "#ffefd5",
+    "peachpuff": "#ffdab9", "peru": "#cd853f", "pink": "#ffc0cb",
+    "plum": "#dda0dd", "powderblue": "#b0e0e6", "purple": "#800080",
+    "rebeccapurple": "#663399", "red": "#ff0000", "rosybrown": "#bc8f8f",
+    "royalblue": "#4169e1", "saddlebrown": "#8b4513", "salmon": "#fa8072",
+    "sandybrown": "#f4a460", "seagreen": "#2e8b57", "seashell": "#fff5ee",
+    "sienna": "#a0522d", "silver": "#c0c0c0", "skyblue": "#87ceeb",
+    "slateblue": "#6a5acd", "slategray": "#708090", "slategrey": "#708090",
+    "snow": "#fffafa", "springgreen": "#00ff7f", "steelblue": "#4682b4",
+    "tan": "#d2b48c", "teal": "#008080", "thistle": "#d8bfd8",
+    "tomato": "#ff6347", "turquoise": "#40e0d0", "violet": "#ee82ee",
+    "wheat": "#f5deb3", "white": "#ffffff", "whitesmoke": "#f5f5f5",
+    "yellow": "#ffff00", "yellowgreen": "#9acd32",
+}
+
+
+def is_named_color(name):
+    """Check if a string is a valid CSS color name"""
+    return name.lower() in NAMED_COLORS
+
+
+def to_hex(color):
+    """
+    Convert various color formats to hexadecimal
+    :param color: Color in any supported format (name, #rgb, #rgba, #rrggbb,
+                  #rrggbbaa, rgb(), rgba(), hsl(), hsla() or an RGB sequence)
+    :return: Hexadecimal color string (e.g., "#ff0000")
+            Returns "#ff0000" (red) for any unconvertable format
+    """
+    if isinstance(color, str):
+        return _parse_color(color.strip().lower())
+
+    if isinstance(color, (tuple, list)) and len(color) >= 3:
+        try:
+            return _rgb_to_hex(*map(int, color[:3]))
+        except (ValueError, TypeError):
+            return FALLBACK_COLOR
+
+    return FALLBACK_COLOR
+
+
+@lru_cache(maxsize=COLOR_CACHE_SIZE)
+def _parse_color(color):
+    if color.startswith(("rgb(", "rgba(")):
+        components = _function_args(color)
+        if len(components) < 3 or not all(_is_int(c) for c in components[:3]):
+            return FALLBACK_COLOR
+        return _rgb_to_hex(*map(int, components[:3]))
+
+    if color.startswith(("hsl(", "hsla(")):
+        return _hsl_to_hex(_function_args(color))
+
+    named = NAMED_COLORS.get(color)
+    if named:
+        return named
+
+    digits = color[1:] if color.startswith("#") else color
+    if not digits or not HEX_DIGITS.issuperset(digits):
+        return FALLBACK_COLOR
+    if len(digits) in (3, 4):
+        return "#" + "".join(c + c for c in digits[:3])
+    if len(digits) in (6, 8):
+        return "#" + digits[:6]
+    return FALLBACK_COLOR
+
+
+def _function_args(color):
+    """Split the arguments of rgb()/hsl() in comma or space syntax"""
+    values = color.split("(", 1)[1].split(")", 1)[0]
+    if "," in values:
+        return [c.strip() for c in values.split(",")]
+    return values.replace("/", " ").split()
+
+
+def _is_int(value):
+    # ASCII digits only: str.isdigit() also accepts "²", which int() rejects
+    return INT_RE.fullmatch(value) is not None
+
+
+def _rgb_to_hex(r, g, b):
+    return "#{:02x}{:02x}{:02x}".format(
+        max(0, min(255, r)),
+        max(0, min(255, g)),
+        max(0, min(255, b)))
+
+
+def _hsl_to_hex(components):
+    if len(components) < 3:
+        return FALLBACK_COLOR
+    hue, saturation, lightness = components[:3]
+    try:
+        h = float(hue[:-3] if hue.endswith("deg") else hue) % 360 / 360
+        s = max(0.0, min(100.0, float(saturation.rstrip("%")))) / 100
+        l = max(0.0, min(100.0, float(lightness.rstrip("%")))) / 100
+    except ValueError:
+        return FALLBACK_COLOR
+    r, g, b = colorsys.hls_to_rgb(h, l, s)
+    return _rgb_to_hex(round(r * 255), round(g * 255), round(b * 255))
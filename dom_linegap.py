@@ -1,14 +1,63 @@
 import re
 import json
-import random
-import string
-import webcolors
+import mmap
+import os
+import zlib
+from bisect import bisect_right
+from contextlib import contextmanager
+from sys import intern
+from types import MappingProxyType
+from colors import is_named_color, to_hex
+from node_names import make_namer
 # from app.parsing.grid_properties import compute_dom_positions
 from grid_detector import process_grid_containers
+from traversal import dump_json, walk
+import instrumentation
+from instrumentation import stage
  
 SELF_CLOSING_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input",
                      "link", "meta", "param", "source", "track", "wbr"}
  
+# Characters str.splitlines() treats as line boundaries
+LINE_BREAKS = frozenset("\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029")
+TEXT_RUN_RE = re.compile(r"[^<\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]+")
+LINE_BREAK_RE = re.compile(r"[\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]")
+TAG_START_RE = re.compile(r"<[a-zA-Z/!]")
+# Characters that end a text run
+TEXT_END_RE = re.compile(r"[<\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]")
+# The same on UTF-8 bytes, where U+0085, U+2028 and U+2029 are multi-byte
+LINE_BREAK_BYTES_RE = re.compile(rb"[\n\r\v\f\x1c\x1d\x1e]|\xc2\x85|\xe2\x80[\xa8\xa9]")
+TEXT_RUN_BYTES_RE = re.compile(
+    rb"(?:[^<\n\r\v\f\x1c\x1d\x1e\xc2\xe2]|\xc2(?!\x85)|\xe2(?!\x80[\xa8\xa9]))+")
+TAG_START_BYTES_RE = re.compile(rb"<[a-zA-Z/!]")
+# First bytes of the line breaks above
+LINE_BREAK_LEADS = frozenset(b"\n\r\v\f\x1c\x1d\x1e\xc2\xe2")
+READ_CHUNK_SIZE = 1 << 16
+# Characters that change how CSSParser reads the text that follows them
+CSS_SPECIAL_RE = re.compile(r"""[{}();,\[\]"'\\]|/\*""")
+CSS_STRING_RE = {quote: re.compile(r"(?:[^%s\\\n]|\\.)*(%s)?" % (quote, quote), re.DOTALL)
+                 for quote in "\"'"}
+CSS_SPACE_RE = re.compile(r"\s*")
+# Fast paths for the common case; anything they reject goes through _scan.
+# A selector list up to its '{' whose commas are all outside brackets
+CSS_SELECTORS_RE = re.compile(r"""[^{};"'\\/()\[\]]*(?:(?:\([^{};,"'\\/()\[\]]*\)"""
+                              r"""|\[[^{};,"'\\/()\[\]]*(?:(?:"[^"\\\n,;{}]*"|'[^'\\\n,;{}]*')"""
+                              r"""[^{};,"'\\/()\[\]]*)*\])[^{};"'\\/()\[\]]*)*\{""")
+# A declaration block body up to its '}' without comments, strings or escapes
+CSS_BLOCK_RE = re.compile(r"""[^{}"'\\/]*(?:/(?!\*)[^{}"'\\/]*)*\}""")
+# Declarations whose ()/[] nest (two levels of parentheses) without a ';' inside
+CSS_NESTING_RE = re.compile(r"[^()\[\]]*(?:(?:\([^()\[\];]*(?:\([^()\[\];]*\)[^()\[\];]*)*\)"
+                            r"|\[[^()\[\];]*\])[^()\[\]]*)*")
+
+# Shared stand-in for a node's attributes/styles until it gets its own dict
+EMPTY_MAPPING = MappingProxyType({})
+
+# Ancestor Bloom filter: each tag, "#id" and ".class" key sets
+# ANCESTOR_FILTER_HASHES of ANCESTOR_FILTER_BITS bits in an int
+ANCESTOR_FILTER_BITS = 512
+ANCESTOR_FILTER_HASHES = 2
+_filter_bits = {}
+ 
 GRID_PROPERTIES = {
     "display", "grid", "grid-template", "grid-template-areas", "grid-template-rows",
     "grid-template-columns", "grid-auto-rows", "grid-auto-columns", "grid-auto-flow",
@@ -17,35 +66,149 @@ GRID_PROPERTIES = {
 }
  
 class HTMLNode:
+    """
+    DOM node. Nodes are slotted and their containers are created lazily:
+    until first written, attributes and styles are a shared read-only empty
+    mapping and children and proxy are an empty tuple, so add children,
+    proxies and text through add_child(), add_proxy() and add_text().
+    """
+
+    __slots__ = ("tag", "attributes", "children", "parent", "is_text", "styles",
+                 "proxy", "_text")
+
     def __init__(self, tag, attributes=None, parent=None, is_text=False):
-        self.tag = tag.lower() if not is_text else "text"
-        self.attributes = attributes or {}
-        self.children = []
+        self.tag = intern(tag.lower()) if not is_text else "text"
+        self.attributes = attributes or EMPTY_MAPPING
+        self.children = ()
         self.parent = parent
         self.is_text = is_text
-        self.styles = {}
-        self.text_content = ""
-        self.proxy = []  # Track line gaps and <br> tags
- 
+        self.styles = EMPTY_MAPPING
+        self.proxy = ()  # Track line gaps and <br> tags
+        self._text = None
+ 
+    @property
+    def text_content(self):
+        text = self._text
+        if text is None:
+            return ""
+        if len(text) > 1:
+            text[:] = ["".join(text)]
+        return text[0]
+
+    @text_content.setter
+    def text_content(self, value):
+        self._text = [value] if value else None
+
     def add_text(self, text):
-        self.text_content += text
- 
-    def apply_styles(self, css_rules):                                                  
-        for selector, properties in css_rules.items():
-            if self.matches(selector):
-                self.styles.update(self._convert_em_to_px(properties))
-        for child in self.children:
-            child.apply_styles(css_rules)
+        if self._text is None:
+            self._text = [text]
+        else:
+            self._text.append(text)
+
+    def add_child(self, child):
+        if self.children:
+            self.children.append(child)
+        else:
+            self.children = [child]
+
+    def add_proxy(self, proxy):
+        if self.proxy:
+            self.proxy.append(proxy)
+        else:
+            self.proxy = [proxy]
  
-    def _is_named_color(self, color_name):
+    def apply_styles(self, css_rules):
+        """
+        Resolves styles for the subtree. When the stylesheet has descendant
+        selectors, the walk carries a Bloom filter of the keys (tag, #id,
+        .class) of each node's ancestors, and a rule whose ancestor parts
+        are not all in it is rejected without walking up the tree.
+        """
+        with stage("apply_styles"):
+            if not isinstance(css_rules, CompiledStylesheet):
+                css_rules = CompiledStylesheet(css_rules)
+            if instrumentation.active() is not None:
+                self._apply_styles_counted(css_rules)
+            elif css_rules.has_ancestor_parts:
+                walk(self, HTMLNode._enter_styles_filtered, state=(css_rules, self._ancestor_filter()))
+            else:
+                walk(self, HTMLNode._enter_styles, state=css_rules)
+
+    def _apply_styles_counted(self, stylesheet):
+        """apply_styles() that also counts nodes, match attempts, hits and filter rejections"""
+        counts = [0, 0, 0, 0]
+
+        def _enter(node, ancestors):
+            counts[0] += 1
+            for rule in stylesheet.candidates(node):
+                counts[1] += 1
+                if rule.ancestor_bits & ancestors != rule.ancestor_bits:
+                    counts[3] += 1
+                    continue
+                if node._matches_parts(rule.parts):
+                    counts[2] += 1
+                    if node.styles is EMPTY_MAPPING:
+                        node.styles = {}
+                    node.styles.update(rule.declarations)
+            return node.children, ancestors | node._filter_bits()
+
+        walk(self, _enter, state=self._ancestor_filter())
+        instrumentation.count("nodes", counts[0])
+        instrumentation.count("match_attempts", counts[1])
+        instrumentation.count("match_hits", counts[2])
+        instrumentation.count("ancestor_filter_rejects", counts[3])
+
+    def _enter_styles(self, stylesheet):
+        for rule in stylesheet.candidates(self):
+            if self._matches_parts(rule.parts):
+                if self.styles is EMPTY_MAPPING:
+                    self.styles = {}
+                self.styles.update(rule.declarations)
+        return self.children, stylesheet
+
+    def _enter_styles_filtered(self, state):
+        stylesheet, ancestors = state
+        for rule in stylesheet.candidates(self):
+            bits = rule.ancestor_bits
+            if bits & ancestors == bits and self._matches_parts(rule.parts):
+                if self.styles is EMPTY_MAPPING:
+                    self.styles = {}
+                self.styles.update(rule.declarations)
+        if not self.children:
+            return None, None
+        return self.children, (stylesheet, ancestors | self._filter_bits())
+
+    def _filter_bits(self):
+        """Ancestor filter bits of this node's tag, id and classes"""
+        bits = _key_bits(self.tag)
+        attributes = self.attributes
+        if attributes:
+            node_id = attributes.get("id")
+            # Numeric ids are parsed to numbers, which no #id part matches
+            if node_id and isinstance(node_id, str):
+                bits |= _key_bits("#" + node_id)
+            class_attr = attributes.get("class")
+            if class_attr and isinstance(class_attr, str):
+                for class_name in class_attr.split():
+                    bits |= _key_bits("." + class_name)
+        return bits
+
+    def _ancestor_filter(self):
+        """Ancestor filter of a node that is not the root of the document"""
+        bits = 0
+        ancestor = self.parent
+        while ancestor is not None:
+            bits |= ancestor._filter_bits()
+            ancestor = ancestor.parent
+        return bits
+ 
+    @staticmethod
+    def _is_named_color(color_name):
         """Check if a string is a valid CSS color name"""
-        try:
-            webcolors.name_to_hex(color_name)
-            return True
-        except ValueError:
-            return False
+        return is_named_color(color_name)
    
-    def _convert_em_to_px(self, properties, base_px=16):
+    @staticmethod
+    def _convert_em_to_px(properties, base_px=16):
         converted = {}
         color_props = {'background', 'background-color', 'color', 'border-color',
                     'border-top-color', 'border-right-color', 'border-bottom-color',
@@ -65,7 +228,7 @@ class HTMLNode:
                             # Check if part is a color that needs conversion
                             if (part.startswith('#') and len(part) != 7) or (  # 3-digit hex or invalid
                                 part.startswith(('rgb(', 'rgba(')) or  # rgb/rgba
-                                (not part.startswith('#') and self._is_named_color(part))):  # named colors
+                                (not part.startswith('#') and HTMLNode._is_named_color(part))):  # named colors
                                 new_parts.append('#000000')
                             else:
                                 new_parts.append(part)
@@ -87,7 +250,7 @@ class HTMLNode:
                         converted[prop] = ' '.join(px_parts)
  
                     elif prop in color_props:
-                        converted[prop] = self._convert_to_hex_color(value)
+                        converted[prop] = HTMLNode._convert_to_hex_color(value)
  
                     else:
                         if prop == 'background':
@@ -104,61 +267,15 @@ class HTMLNode:
  
  
    
-    def _convert_to_hex_color(self, color):
-        """
-        Convert various color formats to hexadecimal
-        :param color: Color in any supported format
-        :return: Hexadecimal color string (e.g., "#ff0000")
-                Returns "#ff0000" (red) for any unconvertable format
-        """
-        if isinstance(color, str):
-            color = color.strip().lower()
-           
-            # Handle rgb/rgba colors
-            if color.startswith(('rgb(', 'rgba(')):
-                try:
-                    values = color.split('(')[1].split(')')[0]
-                    components = [c.strip() for c in values.split(',')]
-                    r, g, b = map(int, components[:3])
-                    return '#{:02x}{:02x}{:02x}'.format(
-                        max(0, min(255, r)),
-                        max(0, min(255, g)),
-                        max(0, min(255, b)))
-                except (ValueError, IndexError):
-                    return "#ff0000"  # Fallback to red
-           
-            # Try named color
-            try:
-                return webcolors.name_to_hex(color)
-            except ValueError:
-                pass  # Continue to hex parsing
-           
-            # Handle hex colors
-            if color.startswith('#'):
-                color = color[1:]
-           
-            if len(color) == 3 and all(c in '0123456789abcdef' for c in color):
-                return f"#{color[0]}{color[0]}{color[1]}{color[1]}{color[2]}{color[2]}"
-           
-            if len(color) == 6 and all(c in '0123456789abcdef' for c in color):
-                return f"#{color}"
-           
-            return "#ff0000"  # Fallback to red
-       
-        elif isinstance(color, (tuple, list)) and len(color) >= 3:
-            try:
-                r, g, b = map(int, color[:3])
-                return '#{:02x}{:02x}{:02x}'.format(
-                    max(0, min(255, r)),
-                    max(0, min(255, g)),
-                    max(0, min(255, b)))
-            except (ValueError, TypeError):
-                return "#ff0000"  # Fallback to red
-       
-        return "#ff0000"  # Fallback to red for all other cases
- 
-    def matches(self, selector):                                            
-        selector_parts = selector.strip().lower().split()
+    @staticmethod
+    def _convert_to_hex_color(color):
+        """Convert various color formats to hexadecimal, "#ff0000" if unconvertable"""
+        return to_hex(color)
+ 
+    def matches(self, selector):
+        return self._matches_parts(selector.strip().lower().split())
+
+    def _matches_parts(self, selector_parts):
         if not selector_parts:
             return False
  
@@ -202,7 +319,23 @@ class HTMLNode:
             else:
                 return self.tag == part
  
-    def to_json(self):                                                  
+    def to_json(self, rng=None, names=None):
+        """
+        Converts the subtree to the component JSON document. Nodes without an
+        id, value or name get an auto_ name from the naming scheme `names`
+        (see node_names): by default random characters drawn from rng (the
+        random module by default; pass random.Random(seed) for reproducible
+        output), or "path", "content" or "counter" for stable names.
+        """
+        result = []
+        with stage("to_json"):
+            walk(self, HTMLNode._enter_json, state=(result, True, make_namer(names, rng)))
+            if instrumentation.active() is not None:
+                instrumentation.count("nodes", _count_nodes(self))
+        return result[0]
+
+    def _split_styles(self):
+        """Splits resolved styles into the JSON (grid, style) dicts"""
         grid = {}
         style = {}
         for prop, value in self.styles.items():
@@ -210,6 +343,15 @@ class HTMLNode:
                 grid[prop] = value
             else:
                 style[prop] = value
+        return grid, style
+
+    def _json_fields(self, namer):
+        """
+        Computes the parts of this node's JSON entry:
+        (name, tag, grid, style, attributes, label_input), where label_input
+        is the checkbox/radio input a <label> wraps, or None.
+        """
+        grid, style = self._split_styles()
  
         attributes = self.attributes.copy()
         if self.text_content.strip():
@@ -223,8 +365,7 @@ class HTMLNode:
         elif "name" in attributes:
             name = attributes["name"]
         else:
-            random_str = ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
-            name = f"auto_{random_str}"
+            name = namer.auto_name(self)
  
         json_tag = self.tag
         if self.tag == "body":
@@ -257,131 +398,619 @@ class HTMLNode:
        
  
        # Special case: label with checkbox or radio input
+        label_input = None
         if self.tag == "label":
             for child in self.children:
                 if child.tag == "input" and child.attributes.get("type", "").lower() in ("checkbox", "radio"):
-                    input_json = child.to_json()
-                    label_json = {
-                        "name": name,
-                        "tag": "label",
-                        "component": [],
-                        "grid": grid,
-                        "style": style,
-                        "attributes": {"value": self.text_content.strip()}
-                    }
-                    components = [input_json, label_json]
-                    if self.proxy:
-                        components.extend([{"proxy": proxy} for proxy in self.proxy])
- 
-                    return {
-                        "name": f"{name}",
-                        "tag": "div",
-                        "component": components,
-                        "grid": {},
-                        "style": {},
-                        "attributes": {}
-                    }
-               
-        # Process children and handle proxies
-        components = []
-        for child in self.children:
-            child_json = child.to_json()
-            components.append(child_json)
-           
-            # Add proxy as separate component after the child
-            if child.proxy:
-                for proxy in child.proxy:
-                    components.append({"proxy": proxy})
- 
-        output = {
+                    label_input = child
+                    break
+
+        return name, json_tag, grid, style, attributes, label_input
+
+    def _label_json(self, name, grid, style):
+        return {
             "name": name,
-            "tag": json_tag,
-            "component": components,
+            "tag": "label",
+            "component": [],
             "grid": grid,
             "style": style,
-            "attributes": attributes
+            "attributes": {"value": self.text_content.strip()}
         }
+
+    def _enter_json(self, state):
+        """
+        Builds this node's JSON entry and places it in the parent's component
+        list. state is (components, leading, namer): a leading entry goes to the
+        front of the list without its proxies (the root, or the input inside
+        a checkbox/radio label); any other entry is appended, followed by its
+        proxies. Returns the children to convert and the state they receive.
+        """
+        components, leading, namer = state
+        name, json_tag, grid, style, attributes, label_input = self._json_fields(namer)
+
+        if label_input is not None:
+            # The input's entry is inserted ahead of the label's
+            label_components = [self._label_json(name, grid, style)]
+            if self.proxy:
+                label_components.extend([{"proxy": proxy} for proxy in self.proxy])
+ 
+            output = {
+                "name": f"{name}",
+                "tag": "div",
+                "component": label_components,
+                "grid": {},
+                "style": {},
+                "attributes": {}
+            }
+            children, child_state = [label_input], (label_components, True, namer)
+        else:
+            output = {
+                "name": name,
+                "tag": json_tag,
+                "component": [],
+                "grid": grid,
+                "style": style,
+                "attributes": attributes
+            }
+            # Children are converted into this list, each followed by its proxies
+            children, child_state = self.children, (output["component"], False, namer)
+
+        if leading:
+            components.insert(0, output)
+        else:
+            components.append(output)
+            # Add proxy as separate component after the child
+            if self.proxy:
+                for proxy in self.proxy:
+                    components.append({"proxy": proxy})
  
- 
-        return output
+        return children, child_state
+
+    def write_json(self, fp, indent=2, rng=None, names=None):
+        """
+        Streams the to_json() document to the text file fp while walking the
+        tree, producing exactly what json.dump(self.to_json(rng, names), fp, indent=indent)
+        writes without building the intermediate dicts. indent may be a
+        number of spaces, a string, or None for compact single-line output.
+        """
+        root = _JSONWriteFrame(fp.write, indent, 0, True, make_namer(names, rng))
+        walk(self, HTMLNode._enter_write, HTMLNode._leave_write, root)
+
+    def _enter_write(self, frame):
+        """
+        Writes the head of this node's entry into the list described by frame
+        and returns a frame for its children. The rest of the entry, and the
+        proxies following it in the parent's list, are written on leave.
+        """
+        pad, level = frame.pad, frame.level
+        # Line break and item separator: "\n" and "," when indented,
+        # "" and ", " for compact output
+        nl, sep = frame.newline, frame.separator
+        inner = nl + pad * (level + 1)
+        outer = nl + pad * level
+        dump = frame.dump
+        if level:
+            frame.write((sep if frame.count else "") + outer)
+        frame.count += 1
+
+        name, json_tag, grid, style, attributes, label_input = self._json_fields(frame.namer)
+
+        if label_input is not None:
+            frame.write("{" + inner + '"name": ' + dump(f"{name}", inner)
+                        + sep + inner + '"tag": "div"' + sep + inner + '"component": [')
+            items = nl + pad * (level + 2)
+            closing = sep + items + dump(self._label_json(name, grid, style), items)
+            for proxy in self.proxy:
+                closing += sep + items + dump({"proxy": proxy}, items)
+            closing += (inner + "]" + sep + inner + '"grid": {}' + sep + inner
+                        + '"style": {}' + sep + inner + '"attributes": {}' + outer + "}")
+            children, leading = [label_input], True
+        else:
+            children, leading = self.children, False
+            frame.write("{" + inner + '"name": ' + dump(name, inner)
+                        + sep + inner + '"tag": ' + dump(json_tag, inner)
+                        + sep + inner + '"component": ' + ("[" if children else "[]"))
+            closing = (inner + "]" if children else "")
+            closing += (sep + inner + '"grid": ' + dump(grid, inner)
+                        + sep + inner + '"style": ' + dump(style, inner)
+                        + sep + inner + '"attributes": ' + dump(attributes, inner)
+                        + outer + "}")
+
+        if not frame.leading:
+            for proxy in self.proxy:
+                closing += sep + outer + dump({"proxy": proxy}, outer)
+
+        child_frame = _JSONWriteFrame(frame.write, frame.indent, level + 2, leading, frame.namer)
+        child_frame.closing = closing
+        return children, child_frame
+
+    def _leave_write(self, frame):
+        frame.write(frame.closing)
+
+
+class _JSONWriteFrame:
+    """Output state of one JSON component list being streamed"""
+
+    __slots__ = ("write", "pad", "newline", "separator", "indent", "level", "leading", "namer",
+                 "count", "closing")
+
+    def __init__(self, write, indent, level, leading, namer):
+        self.write = write
+        if indent is None:
+            self.pad, self.newline, self.separator = "", "", ", "
+        else:
+            # json.dump's rules: a string is used as is, a number counts spaces
+            self.pad = indent if isinstance(indent, str) else " " * indent
+            self.newline, self.separator = "\n", ","
+        self.indent = indent
+        self.level = level        # indentation level of the list's items
+        self.leading = leading    # items are placed without trailing proxies
+        self.namer = namer        # source of auto_ names
+        self.count = 0
+        self.closing = ""
+
+    def dump(self, value, line_break):
+        """
+        Encode value as json.dump would when it follows line_break (a line
+        break and the indentation of its line, or "" for compact output)
+        """
+        if line_break:
+            return json.dumps(value, indent=self.indent).replace("\n", line_break)
+        return json.dumps(value, indent=self.indent)
+
+
+def _key_bits(key):
+    """Bloom filter bits of one tag, "#id" or ".class" key"""
+    bits = _filter_bits.get(key)
+    if bits is None:
+        # crc32 rather than hash(): compiled rules are persisted and must
+        # agree with nodes hashed in another process
+        digest = zlib.crc32(key.encode("utf-8"))
+        bits = 0
+        for _ in range(ANCESTOR_FILTER_HASHES):
+            bits |= 1 << (digest % ANCESTOR_FILTER_BITS)
+            digest //= ANCESTOR_FILTER_BITS
+        if len(_filter_bits) < 65536:
+            _filter_bits[key] = bits
+    return bits
+
+
+def _part_bits(part):
+    """
+    Filter bits an ancestor matching selector part must have set, 0 when the
+    part has no tag, id or class to require (attribute-only parts)
+    """
+    if "[" in part:
+        tag_part = part.split("[", 1)[0]
+        return _key_bits(tag_part) if tag_part else 0
+    if part.startswith((".", "#")):
+        return _key_bits(part) if len(part) > 1 else 0
+    return _key_bits(part)
+
+
+class CompiledRule:
+    """
+    ancestor_bits: union of the ancestor filter bits its ancestor parts
+    require; a node whose ancestor filter lacks any of them cannot match
+    """
+
+    __slots__ = ("order", "selector", "parts", "properties", "declarations", "ancestor_bits")
+
+    def __init__(self, order, selector, parts, properties, declarations):
+        self.order = order
+        self.selector = selector
+        self.parts = parts
+        self.properties = properties
+        self.declarations = declarations
+        self.ancestor_bits = 0
+        for part in parts[:-1]:
+            self.ancestor_bits |= _part_bits(part)
+
+
+class CompiledStylesheet:
+    """
+    Rules bucketed by the rightmost part of their selector (id, class or
+    tag), so a node is only tested against the rules that could match it.
+    Takes the (selector, properties) list from CSSParser.parse() or
+    parse_rules(), or a selector -> properties dict. Rules that cannot be keyed (attribute selectors
+    without a tag) go to a universal bucket that every node checks.
+
+    Each declaration block is converted (em/rem to px, colours to hex) once
+    at compile time and the result is shared by every node the rule matches.
+    Blocks shared by a selector list are converted only once.
+    """
+
+    def __init__(self, css_rules, base_px=16):
+        self.base_px = base_px
+        self.rules = []
+        self.by_id = {}
+        self.by_class = {}
+        self.by_tag = {}
+        self.universal = []
+        self.has_ancestor_parts = False
+        converted = {}
+        if isinstance(css_rules, dict):
+            css_rules = css_rules.items()
+        for selector, properties in css_rules:
+            parts = selector.strip().lower().split()
+            if not parts:
+                continue
+            declarations = converted.get(id(properties))
+            if declarations is None:
+                declarations = HTMLNode._convert_em_to_px(properties, base_px)
+                converted[id(properties)] = declarations
+            rule = CompiledRule(len(self.rules), selector, parts, properties, declarations)
+            self.rules.append(rule)
+            self._bucket_for(parts[-1]).append(rule)
+            self.has_ancestor_parts = self.has_ancestor_parts or len(parts) > 1
+
+    def _bucket_for(self, part):
+        if "[" in part:
+            tag_part = part.split("[", 1)[0]
+            if tag_part:
+                return self.by_tag.setdefault(tag_part, [])
+            return self.universal
+        if part.startswith("."):
+            return self.by_class.setdefault(part[1:], [])
+        if part.startswith("#"):
+            return self.by_id.setdefault(part[1:], [])
+        return self.by_tag.setdefault(part, [])
+
+    def candidates(self, node):
+        """Rules that could match node, in stylesheet order"""
+        buckets = []
+        node_id = node.attributes.get("id", "")
+        if node_id in self.by_id:
+            buckets.append(self.by_id[node_id])
+        class_attr = node.attributes.get("class", "")
+        if isinstance(class_attr, str):
+            for class_name in set(class_attr.split()):
+                if class_name in self.by_class:
+                    buckets.append(self.by_class[class_name])
+        if node.tag in self.by_tag:
+            buckets.append(self.by_tag[node.tag])
+        if self.universal:
+            buckets.append(self.universal)
+
+        if not buckets:
+            return []
+        if len(buckets) == 1:
+            return buckets[0]
+        return sorted((rule for bucket in buckets for rule in bucket),
+                      key=lambda rule: rule.order)
+
+
 class CSSParser:
+    """
+    Single-pass CSS parser. The text is scanned once, left to right, with
+    strings, escapes, comments and bracket nesting honoured, so braces or
+    separators inside them never end a rule. At-rules (@media, @supports,
+    @import, ...) are skipped whole, nested blocks included; their contents
+    do not apply. Problems are collected in `errors` with the line and
+    column where they were found, and parsing carries on past them.
+    """
+
     def __init__(self, css):
         self.css = css
- 
+        self.errors = []
+        self._line_starts = None
+
     def parse(self):
-        rules = {}
-        # Remove all CSS comments first
-        css_without_comments = re.sub(r'/\*.*?\*/', '', self.css, flags=re.DOTALL)
-        # Then remove @media rules
-        css_without_media = re.sub(r'@media\s*.*?{.*?}', '', css_without_comments, flags=re.DOTALL)
-       
-        for match in re.findall(r"([^{]+){([^}]+)}", css_without_media):
-            selectors, declarations = match
-            properties = self.parse_declarations(declarations)
-            for selector in selectors.split(","):
-                cleaned_selector = selector.strip()
-                if cleaned_selector:
-                    rules[cleaned_selector] = properties
+        """
+        Rules as (selector, properties) pairs in source order, the same as
+        parse_rules(). A selector that appears again keeps both of its
+        entries: one dict entry per selector cannot keep the cascade when
+        other rules come between them.
+        """
+        return self.parse_rules()
+
+    def parse_rules(self):
+        """
+        Every (selector, properties) pair in source order, duplicates
+        included. The selectors of one selector list share a properties dict.
+        """
+        with stage("css_parse"):
+            rules = self._parse_rules()
+            instrumentation.count("rules", len(rules))
+            instrumentation.count("errors", len(self.errors))
         return rules
- 
+
+    def _parse_rules(self):
+        css = self.css
+        n = len(css)
+        self.errors = []
+        rules = []
+        pos = 0
+        while True:
+            pos = self._skip_space(pos)
+            if pos >= n:
+                break
+            ch = css[pos]
+            if ch == "@":
+                pos = self._skip_at_rule(pos)
+                continue
+            if ch == "}":
+                self._error(pos, "Unexpected '}'")
+                pos += 1
+                continue
+
+            start = pos
+            match = CSS_SELECTORS_RE.match(css, pos)
+            if match:
+                opened_at = match.end() - 1
+                properties, pos = self._parse_block(opened_at + 1, opened_at)
+                for selector in css[start:opened_at].split(","):
+                    selector = selector.strip()
+                    if selector:
+                        rules.append((selector, properties))
+                continue
+
+            selectors = []
+            while True:
+                text, pos = self._scan(pos, ",{;}")
+                selectors.append(text.strip())
+                if pos >= n or css[pos] != ",":
+                    break
+                pos += 1
+            if pos >= n:
+                self._error(start, "Selector without a declaration block")
+                break
+            if css[pos] != "{":
+                self._error(pos, f"Expected '{{' after selector, found {css[pos]!r}")
+                pos += 1
+                continue
+
+            properties, pos = self._parse_block(pos + 1, pos)
+            for selector in selectors:
+                if selector:
+                    rules.append((selector, properties))
+        return rules
+
+    def compile(self, base_px=16):
+        """Parse and return a CompiledStylesheet with pre-converted declarations"""
+        with stage("css_compile"):
+            return CompiledStylesheet(self.parse_rules(), base_px)
+
     def parse_declarations(self, declarations):
+        """Properties of the contents of one declaration block"""
+        return CSSParser(declarations)._parse_block(0)[0]
+
+    def _parse_block(self, pos, opened_at=None):
+        """
+        Declarations from pos to the closing '}' (or the end of the text
+        when opened_at is None). Returns (properties, position after it).
+        """
+        css = self.css
+        if opened_at is not None:
+            match = CSS_BLOCK_RE.match(css, pos)
+            if match:
+                properties = self._simple_block(css[pos:match.end() - 1])
+                if properties is not None:
+                    return properties, match.end()
+        n = len(css)
+        properties = {}
+        while True:
+            pos = self._skip_space(pos)
+            if pos >= n:
+                if opened_at is not None:
+                    self._error(opened_at, "Unclosed declaration block")
+                return properties, pos
+            ch = css[pos]
+            if ch == "}":
+                return properties, pos + 1
+            if ch == ";":
+                pos += 1
+                continue
+
+            start = pos
+            text, pos = self._scan(pos, ";{}")
+            if pos < n and css[pos] == "{":
+                self._error(start, "Nested rule ignored")
+                pos = self._skip_block(pos + 1, pos)
+                continue
+            if pos < n and css[pos] == ";":
+                pos += 1
+            prop, colon, value = text.partition(":")
+            prop = prop.strip()
+            if colon and prop:
+                properties[intern(prop)] = value.strip()
+            else:
+                self._error(start, f"Invalid declaration {text.strip()!r}")
+
+    def _simple_block(self, text):
+        """
+        Properties of a block body free of comments, strings and escapes,
+        or None when it needs _parse_block's full scan (nesting, errors)
+        """
+        if ("(" in text or "[" in text) and not CSS_NESTING_RE.fullmatch(text):
+            return None
         properties = {}
-        # Remove any remaining comments in declarations
-        declarations = re.sub(r'/\*.*?\*/', '', declarations)
-        for declaration in declarations.split(";"):
-            declaration = declaration.strip()
-            if ":" in declaration:
-                prop, value = map(str.strip, declaration.split(":", 1))
-                properties[prop] = value
+        for declaration in text.split(";"):
+            prop, colon, value = declaration.partition(":")
+            prop = prop.strip()
+            if colon and prop:
+                properties[intern(prop)] = value.strip()
+            elif colon or prop:
+                return None
         return properties
- 
- 
- 
+
+    def _skip_at_rule(self, pos):
+        """Skip an at-rule: up to its ';' or past its (nested) block"""
+        css = self.css
+        _, end = self._scan(pos + 1, "{;}")
+        if end >= len(css):
+            self._error(pos, "Unterminated at-rule")
+            return end
+        if css[end] == ";":
+            return end + 1
+        if css[end] == "}":
+            return end  # the enclosing context reports or consumes it
+        return self._skip_block(end + 1, end)
+
+    def _skip_block(self, pos, opened_at):
+        """Position after the '}' matching the '{' at opened_at"""
+        css = self.css
+        n = len(css)
+        depth = 1
+        while True:
+            _, pos = self._scan(pos, "{}", keep=False)
+            if pos >= n:
+                self._error(opened_at, "Unclosed block")
+                return pos
+            depth += 1 if css[pos] == "{" else -1
+            pos += 1
+            if not depth:
+                return pos
+
+    def _scan(self, pos, stops, keep=True):
+        """
+        Read from pos up to the first character in stops outside strings,
+        comments, escapes and ()/[] nesting ('}' stops at any nesting).
+        Returns (text without comments, index of the stop or len(css)).
+        """
+        css = self.css
+        n = len(css)
+        pieces = []
+        depth = 0
+        while True:
+            match = CSS_SPECIAL_RE.search(css, pos)
+            if match is None:
+                if keep:
+                    pieces.append(css[pos:])
+                return "".join(pieces), n
+            at = match.start()
+            ch = css[at]
+            if keep and at > pos:
+                pieces.append(css[pos:at])
+            if ch == "}" or (ch in stops and not depth):
+                return "".join(pieces), at
+            if ch == "/":
+                end = css.find("*/", at + 2)
+                if end == -1:
+                    self._error(at, "Unclosed comment")
+                    return "".join(pieces), n
+                pos = end + 2
+                continue
+            if ch == "\\":
+                end = min(at + 2, n)
+            elif ch == '"' or ch == "'":
+                string_match = CSS_STRING_RE[ch].match(css, at + 1)
+                end = string_match.end()
+                if not string_match.group(1):
+                    self._error(at, "Unclosed string")
+            else:
+                if ch in "([":
+                    depth += 1
+                elif ch in ")]" and depth:
+                    depth -= 1
+                end = at + 1
+            if keep:
+                pieces.append(css[at:end])
+            pos = end
+
+    def _skip_space(self, pos):
+        """Skip whitespace and comments"""
+        css = self.css
+        n = len(css)
+        while True:
+            pos = CSS_SPACE_RE.match(css, pos).end()
+            if not css.startswith("/*", pos):
+                return pos
+            end = css.find("*/", pos + 2)
+            if end == -1:
+                self._error(pos, "Unclosed comment")
+                return n
+            pos = end + 2
+
+    def _error(self, pos, message):
+        # Line starts are found once, on the first error, and searched after
+        if self._line_starts is None:
+            self._line_starts = [0] + [match.end() for match in re.finditer("\n", self.css)]
+        line = bisect_right(self._line_starts, pos)
+        column = pos - self._line_starts[line - 1] + 1
+        self.errors.append(f"CSS error at line {line}, column {column}: {message}")
+
+
 class HTMLParser:
-    def __init__(self, html):
+    """
+    Streaming HTML parser. Input is tokenized in a single pass and the tree
+    is built as tokens are recognised, so no intermediate token list is kept.
+    `html` may be a string, a file object or an iterable of string chunks;
+    data can also be pushed with feed() and finished with close().
+
+    `html` may also be UTF-8 bytes, a bytearray or an mmap (see
+    open_mapped()). That input is tokenized as bytes and only tag, attribute
+    and text tokens are decoded, so for a mapped file the document never
+    exists as a str.
+    """
+
+    def __init__(self, html=""):
         self.html = html
         self.root = HTMLNode("html")
         self.stack = [self.root]
         self.errors = []
+        self._chunks = []         # unconsumed input: a partial token, then newer chunks
+        self._waiting = None      # what ends that partial token: "cr", "comment", "tag", "text"
+        self._tail = ""           # last two characters seen while waiting for "-->"
+        self._line_blank = True   # current line holds only whitespace so far
+        self._line_open = False   # current line has at least one character
  
     def parse(self):
-        lines = self.html.splitlines()
-        token_pattern = r"<!--.*?-->|<[^>]+>|[^<]+"  # tokens: comments, tags, or text
-        tokens = []
- 
-        for line in lines:
-            if line.strip() == "":
-                tokens.append({'type': 'linegap'})
-            else:
-                for match in re.finditer(token_pattern, line, re.DOTALL):
-                    tokens.append({'type': 'token', 'value': match.group(0)})
- 
-        for item in tokens:
-            if item['type'] == 'linegap':
-                if self.stack:
-                    current_parent = self.stack[-1]
-                    # Attach line gap to last child if exists, else to parent
-                    if current_parent.children:
-                        target_node = current_parent.children[-1]
-                    else:
-                        target_node = current_parent
-                    if "linegap" not in target_node.proxy:
-                        target_node.proxy.append("linegap")
-                continue
- 
-            token = item['value'].strip()
-            if not token:
-                continue
-            if not self.stack:
-                continue
- 
-            if token.startswith("<") and not token.startswith("</"):
-                self.handle_open_tag(token[1:-1].strip())
-            elif token.startswith("</"):
-                self.handle_close_tag(token[2:-1].strip())
+        with stage("html_parse"):
+            if isinstance(self.html, (bytes, bytearray, mmap.mmap)):
+                self._consume_bytes(self.html)
             else:
-                self.add_text(token)
- 
+                for chunk in self._iter_chunks(self.html):
+                    self.feed(chunk)
+            root = self.close()
+            if instrumentation.active() is not None:
+                instrumentation.count("nodes", _count_nodes(root))
+        return root
+
+    def _iter_chunks(self, source):
+        if isinstance(source, str):
+            yield source
+        elif hasattr(source, "read"):
+            while True:
+                chunk = source.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        else:
+            yield from source
+
+    def feed(self, data):
+        """
+        Tokenize as much of data as possible, keeping any partial token.
+        While a token is pending, chunks are only collected and searched
+        for its end, then joined once it arrives, so a long text run or
+        comment spread over many chunks is scanned once.
+        """
+        self._chunks.append(data)
+        if self._waiting is None or self._completes(data):
+            self._consume(final=False)
+
+    def _completes(self, data):
+        """Whether data may end the pending token"""
+        waiting = self._waiting
+        if waiting == "text":
+            return TEXT_END_RE.search(data) is not None
+        if waiting == "tag":
+            return ">" in data
+        if waiting == "comment":
+            tail = self._tail + data
+            self._tail = tail[-2:]
+            return "-->" in tail
+        return True  # a trailing "\r" is settled by any character
+
+    def close(self):
+        """Flush the remaining input and finish the tree"""
+        self._consume(final=True)
+        if self._line_open and self._line_blank:
+            self.handle_linegap()
+        self._line_blank = True
+        self._line_open = False
+
         # Check for unclosed tags
         if len(self.stack) > 1:
             unclosed = [node.tag for node in self.stack[1:]]
@@ -389,6 +1018,147 @@ class HTMLParser:
         self.finalize_dom_tree()
        
         return self.root
+
+    def _consume(self, final):
+        buf = "".join(self._chunks)
+        n = len(buf)
+        pos = 0
+        waiting = None
+        while pos < n:
+            ch = buf[pos]
+
+            if ch in LINE_BREAKS:
+                if ch == "\r" and pos + 1 == n and not final:
+                    waiting = "cr"
+                    break  # could be the first half of \r\n
+                pos += 2 if buf.startswith("\r\n", pos) else 1
+                if self._line_blank:
+                    self.handle_linegap()
+                self._line_blank = True
+                self._line_open = False
+                continue
+
+            self._line_open = True
+            if ch == "<":
+                self._line_blank = False
+                if buf.startswith("<!--", pos):
+                    end = buf.find("-->", pos + 4)
+                    if end != -1:
+                        pos = end + 3  # comments are dropped
+                        continue
+                    if not final:
+                        waiting = "comment"
+                        self._tail = buf[-2:]
+                        break
+                end = buf.find(">", pos + 1)
+                if end == -1:
+                    if not final:
+                        waiting = "tag"
+                        break
+                    pos += 1  # stray '<' with no closing '>'
+                    continue
+                if end == pos + 1:
+                    pos += 1  # '<>' is not a tag
+                    continue
+                if not TAG_START_RE.match(buf, pos) and LINE_BREAK_RE.search(buf, pos, end):
+                    pos += 1  # stray '<' in text; only real tags may span lines
+                    continue
+                self.handle_token(buf[pos:end + 1])
+                pos = end + 1
+                continue
+
+            match = TEXT_RUN_RE.match(buf, pos)
+            if match.end() == n and not final:
+                waiting = "text"
+                break  # the text run may continue in the next chunk
+            text = match.group(0)
+            if text.strip():
+                self._line_blank = False
+                self.handle_token(text)
+            pos = match.end()
+
+        self._chunks = [buf[pos:]] if pos < n else []
+        self._waiting = waiting
+
+    def _consume_bytes(self, data):
+        """_consume(final=True) over UTF-8 bytes, decoding only the tokens"""
+        n = len(data)
+        pos = 0
+        while pos < n:
+            byte = data[pos]
+
+            if byte in LINE_BREAK_LEADS:
+                if byte == 10:
+                    end = pos + 1
+                elif byte == 13:
+                    end = pos + 2 if data[pos + 1:pos + 2] == b"\n" else pos + 1
+                else:
+                    match = LINE_BREAK_BYTES_RE.match(data, pos)
+                    end = match.end() if match else -1
+                if end != -1:
+                    pos = end
+                    if self._line_blank:
+                        self.handle_linegap()
+                    self._line_blank = True
+                    self._line_open = False
+                    continue
+
+            self._line_open = True
+            if byte == 60:  # "<"
+                self._line_blank = False
+                if data[pos + 1:pos + 2] == b"!" and data[pos:pos + 4] == b"<!--":
+                    end = data.find(b"-->", pos + 4)
+                    if end != -1:
+                        pos = end + 3
+                        continue
+                end = data.find(b">", pos + 1)
+                if end == -1:
+                    pos += 1
+                    continue
+                if end == pos + 1:
+                    pos += 1
+                    continue
+                if not TAG_START_BYTES_RE.match(data, pos) and LINE_BREAK_BYTES_RE.search(data, pos, end):
+                    pos += 1
+                    continue
+                self.handle_token(data[pos:end + 1].decode("utf-8"))
+                pos = end + 1
+                continue
+
+            match = TEXT_RUN_BYTES_RE.match(data, pos)
+            raw = data[pos:match.end()]
+            # Indentation and other ASCII-blank runs are never decoded
+            if raw.strip(b" \t\x1f"):
+                text = raw.decode("utf-8")
+                if text.strip():
+                    self._line_blank = False
+                    self.handle_token(text)
+            pos = match.end()
+
+    def handle_linegap(self):
+        if self.stack:
+            current_parent = self.stack[-1]
+            # Attach line gap to last child if exists, else to parent
+            if current_parent.children:
+                target_node = current_parent.children[-1]
+            else:
+                target_node = current_parent
+            if "linegap" not in target_node.proxy:
+                target_node.add_proxy("linegap")
+
+    def handle_token(self, token):
+        token = token.strip()
+        if not token:
+            return
+        if not self.stack:
+            return
+
+        if token.startswith("<") and not token.startswith("</"):
+            self.handle_open_tag(token[1:-1].strip())
+        elif token.startswith("</"):
+            self.handle_close_tag(token[2:-1].strip())
+        else:
+            self.add_text(token)
  
     def finalize_dom_tree(self):
         """Close all remaining open tags and report unclosed tags"""
@@ -412,15 +1182,15 @@ class HTMLParser:
             attributes = self.parse_attributes(parts[1])
  
         if tag_name == "html" and self.stack[-1] is self.root:
-            self.root.attributes.update(attributes)
+            self.root.attributes = {**self.root.attributes, **attributes}
             return
  
         parent = self.stack[-1]
         node = HTMLNode(tag_name, attributes, parent)
-        parent.children.append(node)
+        parent.add_child(node)
  
         if tag_name == "br":
-            node.proxy.append("br")
+            node.add_proxy("br")
  
         if tag_name not in SELF_CLOSING_TAGS:
             self.stack.append(node)
@@ -431,7 +1201,7 @@ class HTMLParser:
             r'([\w\-:]+)(?:=(".*?"|\'.*?\'|\S+))?', attr_str)
  
         for key, value in attr_matches:
-            key = key.lower()
+            key = intern(key.lower())
             processed_value = True
  
             if value:
@@ -457,7 +1227,7 @@ class HTMLParser:
         found = False
         for i in range(len(self.stack) - 1, -1, -1):
             if self.stack[i].tag == tag:
-                self.stack = self.stack[:i]
+                del self.stack[i:]
                 found = True
                 break
         if not found:
@@ -468,44 +1238,90 @@ class HTMLParser:
         if text:
             self.stack[-1].add_text(text)
  
+@contextmanager
+def open_mapped(path):
+    """
+    Read-only mmap of a file, for HTMLParser or convert_document. An empty
+    file gives b"" (empty files cannot be mapped).
+    """
+    with open(path, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+
+def _count_nodes(root):
+    """Number of HTMLNodes in root's subtree"""
+    counter = [0]
+
+    def _enter(node, state):
+        counter[0] += 1
+        return node.children, None
+
+    walk(root, _enter)
+    return counter[0]
+
+
+def convert_document(html, css_rules, rng=None, names=None):
+    """
+    Run the full conversion for one document: parse the HTML, apply the
+    stylesheet, convert <body> to JSON and process its grid containers.
+
+    Args:
+        html: HTML source accepted by HTMLParser (string, file object, chunks,
+              UTF-8 bytes or an mmap from open_mapped())
+        css_rules: Rules from CSSParser.parse() or a CompiledStylesheet
+        rng: Source of random auto_ names, see HTMLNode.to_json
+        names: Naming scheme for auto_ names, see HTMLNode.to_json
+
+    Returns:
+        tuple: (output JSON dict, list of HTML validation errors)
+    """
+    with stage("convert_document"):
+        html_parser = HTMLParser(html)
+        dom = html_parser.parse()
+        dom.apply_styles(css_rules)
+ 
+        body_node = next((child for child in dom.children if child.tag == "body"), None)
+        if body_node:
+           # Step 1: Convert to JSON and compute basic positions
+            # output = compute_dom_positions(body_node.to_json())
+        # Step 2: Process grid containers and their position properties
+            output = process_grid_containers(body_node.to_json(rng, names))
+        else:
+            output = {"error": "No <body> tag found"}
+    return output, html_parser.errors
+
+
 def main():
     html_file = "sizetest.html"
     css_file = "sizetest.css"
     output_file = "sizetest.json"
  
-    with open(html_file, "r", encoding="utf-8") as f:
-        html = f.read()
- 
     with open(css_file, "r", encoding="utf-8") as f:
         css = f.read()
  
-    html_parser = HTMLParser(html)
-    dom = html_parser.parse()
- 
-    if html_parser.errors:
-        print("HTML validation errors:")
-        for error in html_parser.errors:
-            print(f"  - {error}")
- 
     css_parser = CSSParser(css)
-    css_rules = css_parser.parse()
+    css_rules = css_parser.compile()
+    if css_parser.errors:
+        print("CSS errors:")
+        for error in css_parser.errors:
+            print(f"  - {error}")
  
-    dom.apply_styles(css_rules)
+    with open_mapped(html_file) as html:
+        output, errors = convert_document(html, css_rules)
  
-    body_node = next((child for child in dom.children if child.tag == "body"), None)
-    if body_node:
-       # Step 1: Convert to JSON and compute basic positions
-        # output = compute_dom_positions(body_node.to_json())
-    # Step 2: Process grid containers and their position properties
-        output = process_grid_containers(body_node.to_json())
-    else:
-        output = {"error": "No <body> tag found"}
+    if errors:
+        print("HTML validation errors:")
+        for error in errors:
+            print(f"  - {error}")
  
     with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(output, f, indent=2)
+        dump_json(output, f, indent=2)
  
     print(f"Generated JSON output at {output_file}")
  
 if __name__ == "__main__":
     main()
- 
\ No newline at end of file
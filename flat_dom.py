@@ -0,0 +1,157 @@
+# flat_dom.py
+"""
+Columnar, array-backed form of a grid JSON tree.
+
+FlatDOM numbers the entries of a to_json() tree in document (pre-order)
+order and keeps the structure in parallel arrays instead of nested
+component lists:
+
+    parent, first_child, next_sibling   node indexes, -1 for none
+    tag                                 ids into tag_names (interned tags)
+    container                           1 where grid display is grid/inline-grid
+    placed                              1 where a container placed the node
+    pos_row, pos_col,
+    pos_row_span, pos_col_span          grid position, 0 until computed
+
+fields[i] holds entry i itself without its children (its "component"
+value is None), so the per-node dicts the passes edit are still plain
+dicts, and non-dict component items (which the passes skip) are kept as
+they are. Parents always come before their children, so a forward loop over
+the indexes visits the tree in the same order as a pre-order walk.
+
+Bulk questions become scans over the arrays: containers() searches the
+container bytes with bytes.find, and indexes of a tag compare small ints.
+The alignment, sizing and position passes have flat variants
+(align_grid_flat, size_grid_flat, position_grid_flat) that run on this form.
+
+    flat = FlatDOM.from_json(tree)
+    position.run_grid_passes_flat(flat)
+    tree = flat.to_json()
+"""
+from array import array
+
+GRID_DISPLAYS = ("grid", "inline-grid")
+
+
+class FlatDOM:
+    def __init__(self):
+        self.fields = []
+        self.parent = array("i")
+        self.first_child = array("i")
+        self.next_sibling = array("i")
+        self.tag = array("i")
+        self.container = bytearray()
+        self.placed = bytearray()
+        self.pos_row = array("i")
+        self.pos_col = array("i")
+        self.pos_row_span = array("i")
+        self.pos_col_span = array("i")
+        self.tag_names = []
+        self._tag_ids = {}
+
+    def __len__(self):
+        return len(self.fields)
+
+    @classmethod
+    def from_json(cls, document, copy_node=dict):
+        """
+        Flatten a to_json() tree. copy_node(entry) must return a new dict for
+        each dict entry (dict by default; pass a deeper copy if the dicts
+        inside entries must not be shared with document either).
+        """
+        flat = cls()
+        fields = flat.fields
+        parents = flat.parent
+        first_child = flat.first_child
+        next_sibling = flat.next_sibling
+        tags = flat.tag
+        container = flat.container
+        tag_ids = flat._tag_ids
+        last_child = []  # per node, its latest child so far
+        # Explicit stack with children pushed in reverse: a pre-order walk
+        stack = [(document, -1)]
+        pop = stack.pop
+        extend = stack.extend
+        while stack:
+            entry, parent = pop()
+            index = len(fields)
+            children = None
+            if isinstance(entry, dict):
+                children = entry.get("component")
+                entry = copy_node(entry)
+                if "component" in entry:
+                    entry["component"] = None
+                grid = entry.get("grid")
+                container.append(isinstance(grid, dict) and grid.get("display") in GRID_DISPLAYS)
+                tag = entry.get("tag")
+                tags.append(tag_ids[tag] if tag in tag_ids else flat._tag_id(tag))
+            else:
+                container.append(0)
+                tags.append(-1)
+            fields.append(entry)
+            parents.append(parent)
+            first_child.append(-1)
+            next_sibling.append(-1)
+            last_child.append(-1)
+            if parent >= 0:
+                previous = last_child[parent]
+                if previous < 0:
+                    first_child[parent] = index
+                else:
+                    next_sibling[previous] = index
+                last_child[parent] = index
+            if children:
+                extend([(child, index) for child in reversed(children)])
+        count = len(fields)
+        flat.placed = bytearray(count)
+        for name in ("pos_row", "pos_col", "pos_row_span", "pos_col_span"):
+            setattr(flat, name, array("i", [0]) * count)
+        return flat
+
+    def _tag_id(self, tag):
+        tag_id = self._tag_ids.get(tag)
+        if tag_id is None:
+            tag_id = self._tag_ids[tag] = len(self.tag_names)
+            self.tag_names.append(tag)
+        return tag_id
+
+    def children(self, index):
+        """Indexes of a node's children, in order"""
+        child = self.first_child[index]
+        next_sibling = self.next_sibling
+        while child >= 0:
+            yield child
+            child = next_sibling[child]
+
+    def containers(self):
+        """Indexes of the grid containers, in document order"""
+        container = self.container
+        indexes = []
+        index = container.find(1)
+        while index >= 0:
+            indexes.append(index)
+            index = container.find(1, index + 1)
+        return indexes
+
+    def with_tag(self, tag):
+        """Indexes of the nodes whose JSON tag is tag"""
+        tag_id = self._tag_ids.get(tag)
+        if tag_id is None:
+            return []
+        return [index for index, value in enumerate(self.tag) if value == tag_id]
+
+    def to_json(self):
+        """The tree as nested entries again, sharing the field values"""
+        fields = self.fields
+        parents = self.parent
+        entries = []
+        for index, entry in enumerate(fields):
+            if isinstance(entry, dict):
+                entry = dict(entry)
+                if "component" in entry:
+                    entry["component"] = []
+            entries.append(entry)
+            parent = parents[index]
+            if parent >= 0:
+                entries[parent]["component"].append(entry)
+        return entries[0] if entries else None
@@ -0,0 +1,120 @@
+# grid_areas.py
+"""
+grid-template-areas parsing.
+
+parse_template_areas() turns a value such as
+
+    "head head" "nav main" ". foot"
+
+into a TemplateAreas index mapping each area name to its rectangle of
+grid lines, so placing an item by area name is a dict lookup. Values are
+memoized, so containers sharing a template parse it once. A value whose
+rows differ in length or whose areas are not rectangles is invalid, as in
+CSS, and parses to None.
+"""
+import re
+
+TEMPLATE_AREAS_CACHE_SIZE = 1024
+
+_STRING_RE = re.compile(r'"([^"]*)"|\'([^\']*)\'')
+_CELL_RE = re.compile(r"(\.+)|([\w-]+)|(\S)")
+
+_template_areas = {}
+
+
+class TemplateAreas:
+    """
+    areas: name -> (row_start, column_start, row_end, column_end), 1-based
+           lines with exclusive ends
+    rows, columns: size of the grid the template spans
+    """
+
+    __slots__ = ("areas", "rows", "columns")
+
+    def __init__(self, areas, rows, columns):
+        self.areas = areas
+        self.rows = rows
+        self.columns = columns
+
+    def __repr__(self):
+        return f"TemplateAreas({self.areas!r})"
+
+
+def parse_template_areas(value):
+    """Memoized TemplateAreas of a grid-template-areas value; None if none or invalid"""
+    try:
+        return _template_areas[value]
+    except KeyError:
+        pass
+
+    template_areas = None
+    if isinstance(value, str):
+        rows = [match.group(1) if match.group(1) is not None else match.group(2)
+                for match in _STRING_RE.finditer(value)]
+        if rows:
+            template_areas = _index_areas(rows)
+
+    if len(_template_areas) >= TEMPLATE_AREAS_CACHE_SIZE:
+        _template_areas.clear()
+    _template_areas[value] = template_areas
+    return template_areas
+
+
+def split_template_rows(rows_part):
+    """
+    Split the rows half of a grid-template value with area strings, such as
+    '[top] "a a" 40px "b b"', into (areas value, row track list). Rows
+    without a size are auto. Returns (None, rows_part) if there are no strings.
+    """
+    strings = list(_STRING_RE.finditer(rows_part))
+    if not strings:
+        return None, rows_part
+    tracks = [rows_part[:strings[0].start()].strip()]
+    for index, match in enumerate(strings):
+        end = strings[index + 1].start() if index + 1 < len(strings) else len(rows_part)
+        after = rows_part[match.end():end].strip()
+        # Everything after a string but its line names is its row size
+        if not re.sub(r"\[[^\]]*\]", "", after).strip():
+            tracks.append("auto")
+        tracks.append(after)
+    areas = " ".join(match.group(0) for match in strings)
+    return areas, " ".join(part for part in tracks if part)
+
+
+def _index_areas(rows):
+    """TemplateAreas of the row strings, or None if they do not form valid areas"""
+    bounds = {}
+    columns = None
+    for row_index, row in enumerate(rows, 1):
+        column_index = 0
+        for match in _CELL_RE.finditer(row):
+            if match.group(3) is not None:
+                return None  # not a name, not a null cell
+            column_index += 1
+            name = match.group(2)
+            if name is None:
+                continue
+            box = bounds.get(name)
+            if box is None:
+                bounds[name] = [row_index, column_index, row_index, column_index, 1]
+            else:
+                box[0] = min(box[0], row_index)
+                box[1] = min(box[1], column_index)
+                box[2] = max(box[2], row_index)
+                box[3] = max(box[3], column_index)
+                box[4] += 1
+        if columns is None:
+            columns = column_index
+        elif column_index != columns:
+            return None  # rows of different lengths
+    if not columns:
+        return None
+
+    areas = {}
+    for name, (top, left, bottom, right, cells) in bounds.items():
+        # Cells are only counted inside the bounding box, so a full count
+        # means the area fills it
+        if cells != (bottom - top + 1) * (right - left + 1):
+            return None
+        areas[name] = (top, left, bottom + 1, right + 1)
+    return TemplateAreas(areas, len(rows), columns)
@@ -1,30 +1,35 @@
 # grid_detector.py
+import instrumentation
 from position import process_position_properties
+from traversal import walk
  
+def is_grid_container(node):
+    """Check if node has display:grid"""
+    style = node.get('style', {})
+    grid = node.get('grid', {})
+    return (style.get('display') == 'grid' or
+            grid.get('display') == 'grid' or
+            node.get('attributes', {}).get('display') == 'grid')
+
+
 def process_grid_containers(dom_tree):
     """
     Finds all nodes with display:grid and processes their position properties
     """
-    def _traverse(node):
+    def _enter(node, state):
         if not isinstance(node, dict):
-            return
+            return None, None
        
-        # Check if current node is a grid container
-        if _is_grid_container(node):
+        # Check if current node is a grid container. Its pass covers the
+        # whole subtree, nested containers included, so stop there
+        if is_grid_container(node):
             process_position_properties(node)
+            instrumentation.count("containers")
+            return None, None
        
-        # Process children recursively
-        for child in node.get('component', []):
-            _traverse(child)
+        # Process children
+        return node.get('component', []), None
    
-    def _is_grid_container(node):
-        """Check if node has display:grid"""
-        style = node.get('style', {})
-        grid = node.get('grid', {})
-        return (style.get('display') == 'grid' or
-                grid.get('display') == 'grid' or
-                node.get('attributes', {}).get('display') == 'grid')
-   
-    _traverse(dom_tree)
+    with instrumentation.stage("process_grid_containers"):
+        walk(dom_tree, _enter)
     return dom_tree
- 
\ No newline at end of file
@@ -0,0 +1,74 @@
+# grid_pipeline.py
+import time
+
+import instrumentation
+from traversal import walk
+
+
+class GridPipeline:
+    """
+    Runs a sequence of grid passes over a DOM JSON tree in a single
+    pre-order traversal.
+
+    A pass is a callable ``handler(node, parent_state)`` that processes one
+    node dict and returns the state handed to that node's children (None for
+    passes that carry no context). At each node the passes run in
+    registration order, so every pass sees the node exactly as it would after
+    the earlier passes had walked the whole tree.
+    """
+
+    def __init__(self, handlers=()):
+        self.handlers = list(handlers)
+
+    def register(self, handler):
+        """Add a pass after the existing ones; usable as a decorator"""
+        self.handlers.append(handler)
+        return handler
+
+    def run(self, dom_tree, copy_node=None):
+        """
+        Apply every pass to dom_tree and return the processed tree.
+
+        If copy_node is given, the tree is copied during the same walk: the
+        root and each node's children are replaced by copy_node(child) before
+        any pass sees them, so passes only ever mutate the copies.
+        """
+        handlers = self.handlers
+        recorder = instrumentation.active()
+        if recorder is not None:
+            timings = [[0.0, 0] for _ in handlers]
+            handlers = [_timed(handler, timing) for handler, timing in zip(handlers, timings)]
+            start = time.perf_counter()
+
+        def _enter(node, parent_states):
+            if not isinstance(node, dict):
+                return None, None
+            if copy_node is not None and 'component' in node:
+                node['component'] = [copy_node(child) for child in node['component']]
+            states = [handler(node, state) for handler, state in zip(handlers, parent_states)]
+            return node.get('component', []), states
+
+        if copy_node is not None:
+            dom_tree = copy_node(dom_tree)
+        walk(dom_tree, _enter, state=[None] * len(handlers))
+
+        if recorder is not None:
+            # The passes interleave, so each gets one span of its summed time
+            for handler, (seconds, nodes) in zip(self.handlers, timings):
+                recorder.add_span(f"grid_pass:{handler.__name__}", start, seconds, {"nodes": nodes})
+                start += seconds
+        return dom_tree
+
+
+def _timed(handler, timing):
+    """handler, adding its run time and call count to timing"""
+    perf_counter = time.perf_counter
+
+    def _run(node, state):
+        started = perf_counter()
+        result = handler(node, state)
+        timing[0] += perf_counter() - started
+        timing[1] += 1
+        return result
+
+    return _run
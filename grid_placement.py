@@ -0,0 +1,333 @@
+# grid_placement.py
+"""
+CSS grid item placement (CSS Grid Level 1, section 8).
+
+place_grid_items() resolves each item's grid-row/grid-column lines
+against the container's track lists and template areas (numbers,
+negative numbers, named lines, area names, spans) and runs the auto-placement algorithm for the rest, in
+sparse or dense mode and in either flow direction:
+
+1. items with a definite row and column are placed as given;
+2. items locked to a row (a column in column flow) take the first free
+   column in it;
+3. the implicit grid gets enough columns for every placed item and for
+   the widest remaining item;
+4. the remaining items are placed with the auto-placement cursor.
+
+Occupied cells are kept as one integer bitmask per row, so checking or
+finding room for an item of any column span is a few integer operations
+per row it covers. The sparse cursor only moves forward, and dense
+searches resume from the row where the last item of the same size
+landed, so a container's placement stays close to linear in its items.
+"""
+import re
+
+from grid_tracks import Repeat
+
+# Line numbers are clamped to this range, as browsers do
+MAX_LINE = 10000
+
+_INTEGER_RE = re.compile(r"[+-]?\d+")
+
+
+def is_grid_item(entry):
+    """
+    Whether a container's child entry is a grid item: a component (it has a
+    name), not a {"proxy": ...} entry such as a line gap
+    """
+    return isinstance(entry, dict) and "name" in entry and "proxy" not in entry
+
+
+def place_grid_items(items, columns=None, rows=None, auto_flow="row", areas=None):
+    """
+    Place the items of one grid container.
+
+    Args:
+        items: (row_start, row_end, column_start, column_end) line values
+               per item, in order-modified document order ("auto", "2",
+               "-1", "span 2", "header", "col 2", "span col"...)
+        columns: TrackList of grid-template-columns, or None
+        rows: TrackList of grid-template-rows, or None
+        auto_flow: grid-auto-flow value
+        areas: TemplateAreas of grid-template-areas, or None; an area name
+               used as a line resolves to that area's edge
+
+    Returns:
+        list: (row, column, row_span, column_span) per item, with 1-based
+              lines of the grid's first explicit track
+    """
+    flow = auto_flow.split() if isinstance(auto_flow, str) else []
+    dense = "dense" in flow
+    column_flow = "column" in flow
+
+    row_areas, column_areas = {}, {}
+    if areas is not None:
+        for name, (row_start, column_start, row_end, column_end) in areas.areas.items():
+            row_areas[name] = (row_start, row_end)
+            column_areas[name] = (column_start, column_end)
+    row_axis = _Axis(rows, row_areas, areas.rows if areas is not None else 0)
+    column_axis = _Axis(columns, column_areas, areas.columns if areas is not None else 0)
+
+    # Work on (major, minor) axes: major is the axis new tracks are added to
+    resolved = []
+    for row_start, row_end, column_start, column_end in items:
+        row = _resolve_axis(row_start, row_end, row_axis)
+        column = _resolve_axis(column_start, column_end, column_axis)
+        resolved.append((column, row) if column_flow else (row, column))
+    minor_explicit = row_axis.explicit if column_flow else column_axis.explicit
+
+    occupancy = _Occupancy()
+    placements = [None] * len(resolved)
+
+    # Step 1: items with a definite position on both axes
+    for index, ((major, major_span), (minor, minor_span)) in enumerate(resolved):
+        if major is not None and minor is not None:
+            occupancy.occupy(major, major_span, minor, minor_span)
+            placements[index] = (major, minor, major_span, minor_span)
+
+    # Step 2: items locked to a major track
+    cursors = {}
+    for index, ((major, major_span), (minor, minor_span)) in enumerate(resolved):
+        if major is not None and minor is None:
+            start = 1 if dense else cursors.get(major, 1)
+            minor = occupancy.first_fit(major, major_span, minor_span, start)
+            occupancy.occupy(major, major_span, minor, minor_span)
+            placements[index] = (major, minor, major_span, minor_span)
+            cursors[major] = minor + minor_span
+
+    # Step 3: minor tracks of the implicit grid
+    minor_count = minor_explicit
+    for index, ((major, major_span), (minor, minor_span)) in enumerate(resolved):
+        placement = placements[index]
+        if placement is not None:
+            minor_count = max(minor_count, placement[1] + placement[3] - 1)
+        elif minor is not None:
+            minor_count = max(minor_count, minor + minor_span - 1)
+        else:
+            minor_count = max(minor_count, minor_span)
+
+    # Step 4: everything else, with the auto-placement cursor
+    cursor_major, cursor_minor = 1, 1
+    resume = {}  # dense: first major track still worth trying, per item shape
+    for index, ((major, major_span), (minor, minor_span)) in enumerate(resolved):
+        if placements[index] is not None:
+            continue
+        if minor is not None:
+            if dense:
+                shape = (minor, major_span, minor_span)
+                major = resume.get(shape, 1)
+            else:
+                if minor < cursor_minor:
+                    cursor_major += 1
+                major = cursor_major
+            while not occupancy.fits(major, major_span, minor, minor_span):
+                major += 1
+            if dense:
+                resume[shape] = major
+            else:
+                cursor_major, cursor_minor = major, minor
+        else:
+            if dense:
+                shape = (major_span, minor_span)
+                major, start = resume.get(shape, 1), 1
+            else:
+                major, start = cursor_major, cursor_minor
+            while True:
+                minor = occupancy.first_fit(major, major_span, minor_span, start, minor_count)
+                if minor is not None:
+                    break
+                major += 1
+                start = 1
+            if dense:
+                resume[shape] = major
+            else:
+                cursor_major, cursor_minor = major, minor + minor_span
+        occupancy.occupy(major, major_span, minor, minor_span)
+        placements[index] = (major, minor, major_span, minor_span)
+
+    if column_flow:
+        return [(minor, major, minor_span, major_span)
+                for major, minor, major_span, minor_span in placements]
+    return placements
+
+
+class _Occupancy:
+    """Occupied cells: one bitmask of minor tracks (bit 0 = track 1) per major track"""
+
+    def __init__(self):
+        self.tracks = []
+
+    def _mask(self, major, major_span):
+        used = 0
+        for bits in self.tracks[major - 1:major - 1 + major_span]:
+            used |= bits
+        return used
+
+    def fits(self, major, major_span, minor, minor_span):
+        cells = ((1 << minor_span) - 1) << (minor - 1)
+        return not self._mask(major, major_span) & cells
+
+    def first_fit(self, major, major_span, minor_span, start, limit=None):
+        """
+        First minor line >= start where minor_span free tracks follow on
+        every major track the item covers, ending at or before track
+        `limit` (unbounded when None). None if there is no such line.
+        """
+        used = self._mask(major, major_span)
+        width = limit if limit is not None else max(used.bit_length(), start - 1) + minor_span
+        free = ~used & ((1 << width) - 1)
+        # Keep bit i only where bits i .. i + minor_span - 1 are all free
+        runs, run_width = free, 1
+        while run_width < minor_span:
+            step = min(run_width, minor_span - run_width)
+            runs &= runs >> step
+            run_width += step
+        runs >>= start - 1
+        if not runs:
+            return None
+        return start + (runs & -runs).bit_length() - 1
+
+    def occupy(self, major, major_span, minor, minor_span):
+        tracks = self.tracks
+        if len(tracks) < major - 1 + major_span:
+            tracks.extend([0] * (major - 1 + major_span - len(tracks)))
+        cells = ((1 << minor_span) - 1) << (minor - 1)
+        for index in range(major - 1, major - 1 + major_span):
+            tracks[index] |= cells
+
+
+def _explicit_count(track_list):
+    """Explicit tracks of a TrackList; auto-fill/auto-fit repeats count once"""
+    if track_list is None:
+        return 0
+    if track_list.count is not None:
+        return track_list.count
+    return sum(len(track.tracks) if isinstance(track, Repeat) else 1
+               for track in track_list.tracks)
+
+
+def _parse_line(value):
+    """
+    A grid line value as (kind, number, name): kind is "auto", "line" or
+    "span"; number defaults to 1 and name to None.
+    """
+    if isinstance(value, int):
+        return ("line", value, None) if value else ("auto", 1, None)
+    if not isinstance(value, str):
+        return "auto", 1, None
+    kind = "line"
+    number = None
+    name = None
+    for token in value.split():
+        lower = token.lower()
+        if lower == "span":
+            kind = "span"
+        elif _INTEGER_RE.fullmatch(token):
+            number = int(token)
+        elif lower == "auto":
+            return "auto", 1, None
+        else:
+            name = token
+    if number is None:
+        if name is None and kind == "line":
+            return "auto", 1, None
+        number = 1
+    if number == 0 or (kind == "span" and number < 0):
+        return "auto", 1, None
+    return kind, number, name
+
+
+class _Axis:
+    """What line resolution needs to know about one axis of a container"""
+
+    __slots__ = ("explicit", "line_index")
+
+    def __init__(self, track_list, area_lines, area_count):
+        self.explicit = max(_explicit_count(track_list), area_count)
+        line_index = dict(track_list.line_index) if track_list is not None else {}
+        # Each area adds implicit <name>-start and <name>-end lines
+        for name, lines in area_lines.items():
+            for suffix, line in zip(("-start", "-end"), lines):
+                named = line_index.get(name + suffix, ())
+                if line not in named:
+                    line_index[name + suffix] = tuple(sorted(named + (line,)))
+        self.line_index = line_index
+
+
+def _resolve_axis(start_value, end_value, axis):
+    """
+    (start line, span) of one axis; start is None when the item is
+    auto-placed on this axis.
+    """
+    start = _parse_line(start_value)
+    end = _parse_line(end_value)
+    if start[0] == "span" and end[0] == "span":
+        end = ("auto", 1, None)
+
+    if start[0] != "line" and end[0] != "line":
+        span = start[1] if start[0] == "span" else end[1] if end[0] == "span" else 1
+        if (start[0] == "span" and start[2]) or (end[0] == "span" and end[2]):
+            span = 1  # named spans of auto-placed items count as 1
+        return None, min(span, MAX_LINE)
+
+    if start[0] == "line" and end[0] == "line":
+        first = _line_number(start[1], start[2], axis, "-start")
+        last = _line_number(end[1], end[2], axis, "-end")
+        if last < first:
+            first, last = last, first
+        elif last == first:
+            last = first + 1
+    elif start[0] == "line":
+        first = _line_number(start[1], start[2], axis, "-start")
+        last = _span_end(first, end, axis, 1)
+    else:
+        last = _line_number(end[1], end[2], axis, "-end")
+        first = _span_end(last, start, axis, -1)
+
+    # Lines before the explicit grid are not tracked: shift such items in
+    if first < 1:
+        last += 1 - first
+        first = 1
+    first = min(first, MAX_LINE)
+    last = min(max(last, first + 1), MAX_LINE + 1)
+    return first, last - first
+
+
+def _line_number(number, name, axis, side):
+    """
+    Line index of the number-th line (from the end when negative) named
+    name. A lone name first matches the <name>-start or <name>-end line
+    for its side, which is how an area name picks its edges.
+    """
+    if name is None:
+        return number if number > 0 else axis.explicit + 2 + number
+    lines = axis.line_index.get(name + side) if number == 1 else None
+    if lines:
+        return lines[0]
+    lines = axis.line_index.get(name, ())
+    if number > 0:
+        if number <= len(lines):
+            return lines[number - 1]
+        # Implicit lines after the explicit grid all count as named
+        return axis.explicit + 1 + number - len(lines)
+    if -number <= len(lines):
+        return lines[number]
+    return 1 - (-number - len(lines))
+
+
+def _span_end(line, span, axis, direction):
+    """Line reached by spanning from line in direction (+1 or -1)"""
+    if span[0] != "span":
+        return line + direction
+    if span[2] is None:
+        return line + direction * span[1]
+    lines = [named for named in axis.line_index.get(span[2], ())
+             if (named - line) * direction > 0]
+    if direction < 0:
+        lines.reverse()
+    if span[1] <= len(lines):
+        return lines[span[1] - 1]
+    remaining = span[1] - len(lines)
+    if direction > 0:
+        return max(line, axis.explicit + 1) + remaining
+    return min(line, 1) - remaining
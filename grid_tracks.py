@@ -0,0 +1,251 @@
+# grid_tracks.py
+"""
+Shared parser for grid track lists (grid-template-rows/-columns values).
+
+parse_track_list() turns a value such as
+
+    [full-start] minmax(100px, 1fr) repeat(3, [col] 2fr) [full-end]
+
+into a TrackList of typed entries (TrackSize, MinMax, Repeat) and named
+lines, plus the expanded form with fixed repeat() counts unrolled. Results
+are memoized by value, and also under their canonical text, so a document
+repeating the same template parses it once no matter which grid pass asks.
+TrackLists are shared between callers and must not be modified.
+"""
+import re
+
+TRACK_LIST_CACHE_SIZE = 4096
+# Fixed repeat() counts are unrolled only up to this many tracks
+MAX_EXPANDED_TRACKS = 10000
+
+TRACK_KEYWORDS = {"auto", "min-content", "max-content"}
+
+_SPACE_RE = re.compile(r"\s*")
+_WORD_RE = re.compile(r"[^\s\[\]()]+")
+_SIZE_RE = re.compile(r"([+-]?(?:\d+\.?\d*|\.\d+)(?:e[+-]?\d+)?)([a-z%]*)", re.IGNORECASE)
+
+_track_lists = {}
+
+
+class TrackSize:
+    """
+    A single track size. value/unit are 1.0/"fr", 100.0/"px", 50.0/"%",
+    2.0/"em"...; keywords have value None and the keyword as unit; anything
+    else (fit-content(), calc(), unknown words) has both None.
+    """
+
+    __slots__ = ("text", "value", "unit")
+
+    def __init__(self, text, value, unit):
+        self.text = text
+        self.value = value
+        self.unit = unit
+
+    def __repr__(self):
+        return f"TrackSize({self.text!r})"
+
+
+class MinMax:
+    """minmax(minimum, maximum), both TrackSizes"""
+
+    __slots__ = ("text", "minimum", "maximum")
+
+    def __init__(self, text, minimum, maximum):
+        self.text = text
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def __repr__(self):
+        return f"MinMax({self.text!r})"
+
+
+class Repeat:
+    """
+    repeat(count, tracks): count is an int or "auto-fill"/"auto-fit";
+    line_names holds the names around the repeated tracks, as in TrackList.
+    """
+
+    __slots__ = ("text", "count", "tracks", "line_names")
+
+    def __init__(self, text, count, tracks, line_names):
+        self.text = text
+        self.count = count
+        self.tracks = tracks
+        self.line_names = line_names
+
+    def __repr__(self):
+        return f"Repeat({self.text!r})"
+
+
+class TrackList:
+    """
+    A parsed track list.
+
+    entries: TrackSize/MinMax/Repeat entries as written
+    tracks: entries with fixed repeat() counts unrolled; auto-fill/auto-fit
+            repeats (and oversized ones) stay Repeat entries
+    line_names: tuple of name tuples, one per line of `tracks`
+                (len(tracks) + 1); names meeting at a line are merged
+    line_index: name -> tuple of the (1-based) lines carrying it
+    count: number of explicit tracks, or None if a Repeat is left in tracks
+    canonical: the expanded form as text
+    """
+
+    __slots__ = ("entries", "entry_line_names", "tracks", "line_names", "line_index", "count",
+                 "canonical")
+
+    def __init__(self, entries, entry_line_names):
+        self.entries = entries
+        self.entry_line_names = entry_line_names
+
+        tracks = []
+        names = [list(entry_line_names[0])]
+        for entry, after in zip(entries, entry_line_names[1:]):
+            if (isinstance(entry, Repeat) and isinstance(entry.count, int)
+                    and len(tracks) + entry.count * len(entry.tracks) <= MAX_EXPANDED_TRACKS):
+                for _ in range(entry.count):
+                    names[-1].extend(entry.line_names[0])
+                    for track, track_after in zip(entry.tracks, entry.line_names[1:]):
+                        tracks.append(track)
+                        names.append(list(track_after))
+            else:
+                tracks.append(entry)
+                names.append([])
+            names[-1].extend(after)
+        self.tracks = tuple(tracks)
+        self.line_names = tuple(tuple(line) for line in names)
+        line_index = {}
+        for line, line_names in enumerate(self.line_names, 1):
+            for name in line_names:
+                line_index.setdefault(name, []).append(line)
+        self.line_index = {name: tuple(lines) for name, lines in line_index.items()}
+        self.count = None if any(isinstance(track, Repeat) for track in tracks) else len(tracks)
+
+        parts = []
+        for line, track in zip(self.line_names, self.tracks):
+            if line:
+                parts.append(f"[{' '.join(line)}]")
+            parts.append(track.text)
+        if self.line_names[-1]:
+            parts.append(f"[{' '.join(self.line_names[-1])}]")
+        self.canonical = " ".join(parts)
+
+    def __repr__(self):
+        return f"TrackList({self.canonical!r})"
+
+
+def parse_track_list(value):
+    """Memoized TrackList for a grid-template-rows/-columns value"""
+    track_list = _track_lists.get(value)
+    if track_list is not None:
+        return track_list
+
+    text = value.strip() if isinstance(value, str) else ""
+    if text.lower() == "none":
+        text = ""
+    track_list = TrackList(*_parse_entries(_tokens(text), True))
+
+    if len(_track_lists) >= TRACK_LIST_CACHE_SIZE:
+        _track_lists.clear()
+    _track_lists[value] = track_list
+    # Passes that rewrite the value to its canonical form hit the cache too
+    _track_lists.setdefault(track_list.canonical, track_list)
+    return track_list
+
+
+def template_tracks(grid, prop):
+    """TrackList of grid[prop], or None when the property is not set"""
+    value = grid.get(prop)
+    return None if value is None else parse_track_list(value)
+
+
+def _tokens(text):
+    """Top-level tokens of a track list: [names], function(...) calls and words"""
+    tokens = []
+    n = len(text)
+    pos = 0
+    while True:
+        pos = _SPACE_RE.match(text, pos).end()
+        if pos >= n:
+            return tokens
+        if text[pos] == "[":
+            end = text.find("]", pos)
+            end = n if end == -1 else end + 1
+        else:
+            match = _WORD_RE.match(text, pos)
+            end = match.end() if match else pos
+            if end < n and text[end] == "(":
+                depth = 0
+                while end < n:
+                    if text[end] == "(":
+                        depth += 1
+                    elif text[end] == ")":
+                        depth -= 1
+                        if not depth:
+                            break
+                    end += 1
+                end = min(end + 1, n)
+            elif end == pos:
+                end = pos + 1  # stray bracket
+        tokens.append(text[pos:end])
+        pos = end
+
+
+def _parse_entries(tokens, allow_repeat):
+    """(entries, line names around them) from a token list"""
+    entries = []
+    names = [[]]
+    for token in tokens:
+        if token.startswith("["):
+            names[-1].extend(token.strip("[]").split())
+            continue
+        if allow_repeat and token[:7].lower() == "repeat(" and token.endswith(")"):
+            entries.append(_parse_repeat(token))
+        else:
+            entries.append(_parse_track(token))
+        names.append([])
+    return tuple(entries), tuple(tuple(line) for line in names)
+
+
+def _parse_repeat(token):
+    args = _split_args(token[7:-1])
+    if len(args) == 2:
+        count_text = args[0].strip().lower()
+        count = count_text if count_text in ("auto-fill", "auto-fit") else None
+        if count_text.isdigit() and int(count_text) > 0:
+            count = int(count_text)
+        tracks, line_names = _parse_entries(_tokens(args[1].strip()), False)
+        if count is not None and tracks:
+            return Repeat(token, count, tracks, line_names)
+    return TrackSize(token, None, None)
+
+
+def _parse_track(token):
+    lower = token.lower()
+    if lower.startswith("minmax(") and token.endswith(")"):
+        args = _split_args(token[7:-1])
+        if len(args) == 2:
+            return MinMax(token, _parse_track(args[0].strip()), _parse_track(args[1].strip()))
+    match = _SIZE_RE.fullmatch(token)
+    if match:
+        return TrackSize(token, float(match.group(1)), match.group(2).lower())
+    if lower in TRACK_KEYWORDS:
+        return TrackSize(token, None, lower)
+    return TrackSize(token, None, None)
+
+
+def _split_args(text):
+    """Split function arguments on top-level commas"""
+    args = []
+    depth = 0
+    start = 0
+    for index, ch in enumerate(text):
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "," and not depth:
+            args.append(text[start:index])
+            start = index + 1
+    args.append(text[start:])
+    return args
@@ -0,0 +1,208 @@
+# instrumentation.py
+"""
+Opt-in per-stage instrumentation for the conversion pipeline.
+
+Pipeline stages are wrapped in stage("name") blocks. While a Recorder is
+active each block records its wall time, the colour conversions made inside
+it, optionally the memory it allocated, and any counters the stage adds
+(nodes, selector match attempts and hits, rules...). The results export as
+a per-stage JSON summary or as a Chrome trace-event file (chrome://tracing,
+Perfetto).
+
+With no active Recorder, stage() hands back one shared no-op context
+manager and stages skip their counting code, so the cost is a global
+lookup per stage, not per node.
+
+    with Recorder(allocations=True) as recorder:
+        convert_document(html, css_rules)
+    recorder.write_chrome_trace("trace.json")
+
+    python instrumentation.py page.html page.css --json stats.json --trace trace.json
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import nullcontext
+
+from colors import _parse_color
+
+_NO_STAGE = nullcontext()
+_recorder = None
+
+
+def stage(name):
+    """Context manager timing one stage under the active Recorder, if any"""
+    if _recorder is None:
+        return _NO_STAGE
+    return _Span(_recorder, name)
+
+
+def active():
+    """The active Recorder, or None when instrumentation is off"""
+    return _recorder
+
+
+def count(name, value=1):
+    """Add value to a counter of the innermost open stage"""
+    if _recorder is not None:
+        _recorder.count(name, value)
+
+
+class Recorder:
+    """
+    Collects stage spans while active. Use it as a context manager, or call
+    start() and stop(). Only one Recorder is active at a time.
+
+    Args:
+        allocations: Also record the net bytes each stage allocated
+                     (uses tracemalloc, which slows everything down)
+    """
+
+    def __init__(self, allocations=False):
+        self.allocations = allocations
+        self.spans = []       # (name, depth, start, seconds, counters), in end order
+        self.counters = {}    # totals over every stage
+        self._open = []
+        self._origin = time.perf_counter()
+        self._started_tracing = False
+        self._previous = None
+
+    def start(self):
+        global _recorder
+        self._previous = _recorder
+        _recorder = self
+        if self.allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        return self
+
+    def stop(self):
+        global _recorder
+        _recorder = self._previous
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def count(self, name, value=1):
+        if self._open:
+            counters = self._open[-1].counters
+            counters[name] = counters.get(name, 0) + value
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_span(self, name, start, seconds, counters=None):
+        """Record a span measured elsewhere (start is a perf_counter() value)"""
+        counters = dict(counters or {})
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+        self.spans.append((name, len(self._open), start - self._origin, seconds, counters))
+
+    def summary(self):
+        """Per-stage totals: calls, seconds and summed counters"""
+        stages = {}
+        for name, _, _, seconds, counters in self.spans:
+            entry = stages.setdefault(name, {"calls": 0, "seconds": 0.0})
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+            for key, value in counters.items():
+                entry[key] = entry.get(key, 0) + value
+        return {"stages": stages, "counters": dict(self.counters)}
+
+    def write_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def chrome_trace(self):
+        """The spans as a Chrome trace-event document"""
+        pid, tid = os.getpid(), threading.get_ident()
+        events = [{"name": name, "ph": "X", "ts": start * 1e6, "dur": seconds * 1e6,
+                   "pid": pid, "tid": tid, "args": counters}
+                  for name, _, start, seconds, counters in sorted(self.spans, key=lambda span: (span[2], span[1]))]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
+
+
+class _Span:
+    __slots__ = ("recorder", "name", "counters", "start", "colors", "memory")
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+        self.counters = {}
+
+    def __enter__(self):
+        info = _parse_color.cache_info()
+        self.colors = (info.hits, info.misses)
+        self.memory = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        self.recorder._open.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        recorder = self.recorder
+        recorder._open.pop()
+        counters = self.counters
+        info = _parse_color.cache_info()
+        conversions = info.hits + info.misses - sum(self.colors)
+        if conversions:
+            counters["color_conversions"] = conversions
+            counters["color_cache_misses"] = info.misses - self.colors[1]
+        if self.memory is not None and tracemalloc.is_tracing():
+            counters["allocated_bytes"] = tracemalloc.get_traced_memory()[0] - self.memory
+        recorder.spans.append((self.name, len(recorder._open), self.start - recorder._origin,
+                               seconds, counters))
+        # Colour and memory figures of nested stages are already part of
+        # the outer stage's, so only outermost stages add to the totals
+        if not recorder._open:
+            for key in ("color_conversions", "color_cache_misses", "allocated_bytes"):
+                if key in counters:
+                    recorder.counters[key] = recorder.counters.get(key, 0) + counters[key]
+        return False
+
+
+def main(argv=None):
+    # Run as a script this module is __main__; the pipeline records into
+    # the imported instrumentation module
+    from instrumentation import Recorder
+    from dom_linegap import CSSParser, convert_document
+
+    parser = argparse.ArgumentParser(description="Convert one document and report where the time goes")
+    parser.add_argument("html_file")
+    parser.add_argument("css_file")
+    parser.add_argument("--json", help="Write the per-stage summary here")
+    parser.add_argument("--trace", help="Write a Chrome trace-event file here")
+    parser.add_argument("--allocations", action="store_true", help="Also record allocated bytes")
+    args = parser.parse_args(argv)
+
+    with Recorder(args.allocations) as recorder:
+        with open(args.css_file, "r", encoding="utf-8") as f:
+            stylesheet = CSSParser(f.read()).compile()
+        with open(args.html_file, "r", encoding="utf-8") as f:
+            convert_document(f, stylesheet)
+
+    if args.json:
+        recorder.write_json(args.json)
+    if args.trace:
+        recorder.write_chrome_trace(args.trace)
+    summary = recorder.summary()
+    for name, entry in summary["stages"].items():
+        extra = ", ".join(f"{key}={value}" for key, value in entry.items() if key not in ("calls", "seconds"))
+        print(f"{name:<32} {entry['calls']:>6} call(s) {entry['seconds'] * 1000:>10.2f} ms  {extra}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+# node_names.py
+"""
+Naming schemes for JSON entries of nodes without an id, value or name.
+
+HTMLNode.to_json() asks a namer for each such node's auto_ name:
+
+- "random" (the default): eight random characters drawn from an rng, as
+  before; pass random.Random(seed) as the rng for reproducible output.
+- "path": a hash of the node's path from the document root, each step
+  being the tag and its index among same-tag siblings (like XPath's
+  div[2]). A node keeps its name while its position does, however the
+  rest of the document, its attributes or the stylesheet change.
+- "content": a hash of the node's subtree (tags, attributes and text, not
+  styles). A node keeps its name wherever it moves as long as its content
+  does; identical subtrees are told apart by their order in the document.
+- "counter": auto_1, auto_2, ... in document order. The cheapest scheme,
+  stable for identical input.
+
+Path and content names are eight base-36 characters, like random ones.
+"""
+import hashlib
+import random
+import string
+
+NAMING_SCHEMES = ("random", "path", "content", "counter")
+
+_ALPHABET = string.ascii_lowercase + string.digits
+_NAME_SPACE = len(_ALPHABET) ** 8
+
+
+def make_namer(names=None, rng=None):
+    """
+    Namer for one conversion.
+
+    Args:
+        names: Scheme name from NAMING_SCHEMES, a namer (anything with an
+               auto_name(node) method), or None for "random"
+        rng: Source of random names (the random module by default)
+    """
+    if names is None or names == "random":
+        return RandomNames(rng or random)
+    if hasattr(names, "auto_name"):
+        return names
+    if names == "path":
+        return PathNames()
+    if names == "content":
+        return ContentNames()
+    if names == "counter":
+        return CounterNames()
+    raise ValueError(f"Unknown naming scheme: {names!r}")
+
+
+def _encode(digest):
+    """Eight base-36 characters from a digest"""
+    number = int.from_bytes(digest[:8], "big") % _NAME_SPACE
+    chars = []
+    for _ in range(8):
+        number, index = divmod(number, 36)
+        chars.append(_ALPHABET[index])
+    return "auto_" + "".join(chars)
+
+
+class RandomNames:
+    __slots__ = ("rng",)
+
+    def __init__(self, rng):
+        self.rng = rng
+
+    def auto_name(self, node):
+        return "auto_" + "".join(self.rng.choices(_ALPHABET, k=8))
+
+
+class CounterNames:
+    __slots__ = ("count",)
+
+    def __init__(self):
+        self.count = 0
+
+    def auto_name(self, node):
+        self.count += 1
+        return f"auto_{self.count}"
+
+
+class PathNames:
+    """
+    Path digests are chained from the parent's, so each node costs one hash
+    however deep it is. Same-tag sibling indexes are computed once per parent.
+    """
+
+    def __init__(self):
+        self._digests = {}         # node -> path digest
+        self._indexes = {}         # parent -> {child: index among same-tag siblings}
+
+    def auto_name(self, node):
+        return _encode(self._digest(node))
+
+    def _digest(self, node):
+        digests = self._digests
+        digest = digests.get(node)
+        if digest is not None:
+            return digest
+        # Resolve the uncached ancestors top-down, without recursion
+        chain = []
+        while node is not None and node not in digests:
+            chain.append(node)
+            node = node.parent
+        digest = digests[node] if node is not None else b""
+        for node in reversed(chain):
+            step = f"{node.tag}[{self._sibling_index(node)}]".encode("utf-8")
+            digest = hashlib.blake2b(digest + b"/" + step, digest_size=16).digest()
+            digests[node] = digest
+        return digest
+
+    def _sibling_index(self, node):
+        parent = node.parent
+        if parent is None:
+            return 0
+        indexes = self._indexes.get(parent)
+        if indexes is None:
+            indexes = {}
+            seen = {}
+            for child in parent.children:
+                indexes[child] = seen.get(child.tag, 0)
+                seen[child.tag] = indexes[child] + 1
+            self._indexes[parent] = indexes
+        return indexes.get(node, 0)
+
+
+class ContentNames:
+    """
+    Subtree digests are computed bottom-up for the whole subtree the first
+    time a node is named, then looked up.
+    """
+
+    def __init__(self):
+        self._digests = {}         # node -> subtree digest
+        self._seen = {}            # subtree digest -> times named so far
+
+    def auto_name(self, node):
+        digest = self._digests.get(node)
+        if digest is None:
+            self._hash_subtree(node)
+            digest = self._digests[node]
+        occurrence = self._seen.get(digest, 0)
+        self._seen[digest] = occurrence + 1
+        if occurrence:
+            digest = hashlib.blake2b(digest + occurrence.to_bytes(8, "big"),
+                                     digest_size=16).digest()
+        return _encode(digest)
+
+    def _hash_subtree(self, root):
+        digests = self._digests
+        stack = [(root, False)]
+        while stack:
+            node, children_done = stack.pop()
+            if not children_done:
+                stack.append((node, True))
+                stack.extend((child, False) for child in node.children if child not in digests)
+                continue
+            content = hashlib.blake2b(digest_size=16)
+            content.update(node.tag.encode("utf-8") + b"\0")
+            for key, value in sorted(node.attributes.items()):
+                content.update(f"{key}={value}".encode("utf-8") + b"\0")
+            content.update(node.text_content.encode("utf-8") + b"\0")
+            for child in node.children:
+                content.update(digests[child])
+            digests[node] = content.digest()
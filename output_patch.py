@@ -0,0 +1,232 @@
+# output_patch.py
+"""
+Structural diff and patch between two grid JSON outputs.
+
+Components are matched by identity: their name, JSON-encoded so that the
+name 12 (from id="12") and the name "12" stay apart, plus the number of
+earlier components with the same name in document order ('"auto_k3j2"#0',
+'"submit"#1', '12#0'). With a stable naming scheme (see node_names) unchanged nodes
+keep their identity between conversions, so the patch only describes what
+changed:
+
+    {
+      "format": 2,
+      "root": key of the root component,
+      "added": {key: entry without "component"},
+      "removed": [key, ...],
+      "moved": [key, ...],              # kept, under a different parent
+      "changed": {key: {"set": {field: {k: v}}, "unset": {field: [k]},
+                        "fields": {field: value}, "drop": [field]}},
+      "children": {key: [child, ...]}   # new component list
+    }
+
+"set"/"unset" update dict fields (grid, style, attributes) key by key;
+"fields"/"drop" replace or remove whole fields (tag, name...). A
+"children" list holds the key of each component and, inline, entries that
+are not components ({"proxy": ...}). It is given for every parent whose list
+changed and for every added component with children, and is null for a
+component that no longer has a "component" field. "removed" and "moved"
+are informational; apply_patch() does not need them.
+
+Both functions are linear in the size of the documents. The document
+apply_patch() returns shares unchanged field values with the base.
+
+    python output_patch.py diff old.json new.json patch.json
+    python output_patch.py apply old.json patch.json new.json
+"""
+import argparse
+import json
+import sys
+
+from traversal import dump_json, walk
+
+PATCH_FORMAT = 2
+
+
+def _is_component(entry):
+    return isinstance(entry, dict) and "name" in entry
+
+
+def _index(document):
+    """
+    key -> (entry, parent key, refs) for every component, in document
+    order; refs is the component list with components replaced by their
+    keys, or None when the entry has no "component" field.
+    """
+    index = {}
+    occurrences = {}
+
+    def _enter(entry, state):
+        parent_key, parent_refs, cursor = state
+        name = json.dumps(entry["name"])
+        occurrence = occurrences.get(name, 0)
+        occurrences[name] = occurrence + 1
+        key = f"{name}#{occurrence}"
+        if parent_refs is not None:
+            # Take the parent's next component slot
+            while parent_refs[cursor[0]] is not None:
+                cursor[0] += 1
+            parent_refs[cursor[0]] = key
+            cursor[0] += 1
+
+        refs = None
+        children = []
+        if "component" in entry:
+            refs = []
+            for child in entry["component"]:
+                if _is_component(child):
+                    children.append(child)
+                    refs.append(None)
+                else:
+                    refs.append(child)
+        index[key] = (entry, parent_key, refs)
+        return children, (key, refs, [0])
+
+    walk(document, _enter, state=(None, None, None))
+    return index
+
+
+def diff_outputs(old, new):
+    """Patch turning the output document old into new"""
+    if not _is_component(old) or not _is_component(new):
+        return {"format": PATCH_FORMAT, "document": new}
+    old_index = _index(old)
+    new_index = _index(new)
+
+    patch = {"format": PATCH_FORMAT, "root": next(iter(new_index)),
+             "added": {}, "removed": [], "moved": [], "changed": {}, "children": {}}
+    for key, (entry, parent_key, refs) in new_index.items():
+        previous = old_index.get(key)
+        if previous is None:
+            patch["added"][key] = {field: value for field, value in entry.items()
+                                   if field != "component"}
+            if refs is not None:
+                patch["children"][key] = refs
+            continue
+        old_entry, old_parent, old_refs = previous
+        if old_parent != parent_key:
+            patch["moved"].append(key)
+        if refs != old_refs:
+            patch["children"][key] = refs
+        changes = _entry_changes(old_entry, entry)
+        if changes:
+            patch["changed"][key] = changes
+    patch["removed"] = [key for key in old_index if key not in new_index]
+    return patch
+
+
+def _entry_changes(old, new):
+    """Field changes between two entries, ignoring their components"""
+    changes = {}
+    for field, value in new.items():
+        if field == "component":
+            continue
+        old_value = old.get(field)
+        if field in old and old_value == value:
+            continue
+        if isinstance(value, dict) and isinstance(old_value, dict):
+            updated = {k: v for k, v in value.items() if k not in old_value or old_value[k] != v}
+            removed = [k for k in old_value if k not in value]
+            if updated:
+                changes.setdefault("set", {})[field] = updated
+            if removed:
+                changes.setdefault("unset", {})[field] = removed
+        else:
+            changes.setdefault("fields", {})[field] = value
+    dropped = [field for field in old if field not in new and field != "component"]
+    if dropped:
+        changes["drop"] = dropped
+    return changes
+
+
+def apply_patch(base, patch):
+    """The document diff_outputs(base, new) was computed to, rebuilt from base"""
+    if patch.get("format") != PATCH_FORMAT:
+        raise ValueError(f"Unsupported patch format: {patch.get('format')!r}")
+    if "document" in patch:
+        return patch["document"]
+    base_index = _index(base) if _is_component(base) else {}
+    added = patch["added"]
+    changed = patch["changed"]
+    new_children = patch["children"]
+
+    def _build(key):
+        """New entry for key, with its component refs still to resolve"""
+        if key in added:
+            entry = dict(added[key])
+            refs = new_children.get(key)
+            if refs is not None:
+                entry["component"] = []
+        else:
+            if key not in base_index:
+                raise ValueError(f"Patch refers to {key!r}, which the base does not have")
+            base_entry, _, refs = base_index[key]
+            entry = dict(base_entry)
+            refs = new_children.get(key, refs)
+            if refs is not None:
+                entry["component"] = []
+            else:
+                entry.pop("component", None)  # None in children: the field was dropped
+            _apply_changes(entry, changed.get(key))
+        return entry, refs if refs is not None else ()
+
+    def _enter(item, components):
+        entry, refs = item
+        components.append(entry)
+        if refs is None:
+            return None, None  # inline entry
+        return [_build(ref) if isinstance(ref, str) else (ref, None) for ref in refs], \
+            entry.get("component")
+
+    holder = []
+    walk(_build(patch["root"]), _enter, state=holder)
+    return holder[0]
+
+
+def _apply_changes(entry, changes):
+    if not changes:
+        return
+    for field, updated in changes.get("set", {}).items():
+        entry[field] = dict(entry.get(field) or {}, **updated)
+    for field, removed in changes.get("unset", {}).items():
+        value = dict(entry[field])
+        for key in removed:
+            value.pop(key, None)
+        entry[field] = value
+    entry.update(changes.get("fields", {}))
+    for field in changes.get("drop", ()):
+        entry.pop(field, None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Diff grid JSON outputs or apply a patch")
+    commands = parser.add_subparsers(dest="command", required=True)
+    diff_parser = commands.add_parser("diff", help="Write the patch from old to new")
+    diff_parser.add_argument("old")
+    diff_parser.add_argument("new")
+    diff_parser.add_argument("patch")
+    apply_parser = commands.add_parser("apply", help="Rebuild a document from base and patch")
+    apply_parser.add_argument("base")
+    apply_parser.add_argument("patch")
+    apply_parser.add_argument("output")
+    args = parser.parse_args(argv)
+
+    if args.command == "diff":
+        with open(args.old, "r", encoding="utf-8") as f:
+            old = json.load(f)
+        with open(args.new, "r", encoding="utf-8") as f:
+            new = json.load(f)
+        with open(args.patch, "w", encoding="utf-8") as f:
+            dump_json(diff_outputs(old, new), f, indent=2)
+    else:
+        with open(args.base, "r", encoding="utf-8") as f:
+            base = json.load(f)
+        with open(args.patch, "r", encoding="utf-8") as f:
+            patch = json.load(f)
+        with open(args.output, "w", encoding="utf-8") as f:
+            dump_json(apply_patch(base, patch), f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,126 +1,345 @@
 # position_processor.py
 import json
-import copy
-from alignment_properties import process_grid_alignment
-from size_properties import process_grid_sizing
+import re
+from alignment_properties import align_grid_node, align_grid_flat, SELF_ALIGNMENT_PROPS
+from size_properties import size_grid_node, size_grid_flat
+from flat_dom import FlatDOM
+from grid_pipeline import GridPipeline
+from grid_placement import is_grid_item, place_grid_items
+from grid_areas import parse_template_areas, split_template_rows
+from grid_tracks import parse_track_list, template_tracks
+from instrumentation import stage
+from traversal import copy_json
+
+LINE_NAME_RE = re.compile(r'-?[A-Za-z_][\w-]*')
 
  
-def process_position_properties(dom_tree):
+def position_grid_node(node, parent_grid=None):
     """
-    Processes all position-related grid properties and calculates pos-row/pos-col
-    based on grid positioning behavior.
+    Grid pass: normalizes a node's grid-row/grid-column shorthands and
+    calculates its pos-row/pos-col. Returns the grid context for its children.
+    Proxy entries (line gaps) are not positioned and take no grid cell.
+    """
+    if 'proxy' in node:
+        return None
+    grid = node.get('grid', {})
+    placement = parent_grid['placements'].get(id(node)) if parent_grid and 'placements' in parent_grid else None
+    current_grid = _position_node(grid, parent_grid, placement)
+
+    # 4. Containers place all of their items at once, using their parsed
+    #    (memoized) track lists
+    if grid.get('display') in ('grid', 'inline-grid'):
+        items = [child for child in node.get('component', [])
+                 if is_grid_item(child) and isinstance(child.get('grid'), dict)]
+        placements = _place_items(grid, items, current_grid)
+        current_grid['placements'] = {id(item): placement
+                                      for item, placement in zip(items, placements)}
+
+    # Children are processed with current grid context
+    return current_grid
+
+
+def position_grid_flat(flat):
+    """
+    Position pass over a FlatDOM. Nodes are visited in index (document)
+    order; containers write their items' placements straight into the
+    pos_* arrays, which end up holding every node's position.
+    """
+    fields = flat.fields
+    parents = flat.parent
+    first_child = flat.first_child
+    placed = flat.placed
+    pos_row, pos_col = flat.pos_row, flat.pos_col
+    row_span, col_span = flat.pos_row_span, flat.pos_col_span
+    contexts = {}  # node index -> grid context for its children
+    for index in range(len(fields)):
+        node = fields[index]
+        if not isinstance(node, dict) or 'proxy' in node:
+            continue
+        grid = node.get('grid', {})
+        placement = None
+        if placed[index]:
+            placement = (pos_row[index], pos_col[index], row_span[index], col_span[index])
+        parent = parents[index]
+        current_grid = _position_node(grid, contexts.get(parent), placement)
+        if placement is None:
+            for values, key in ((pos_row, 'pos-row'), (pos_col, 'pos-col')):
+                if isinstance(grid.get(key), int):
+                    values[index] = grid[key]
+
+        if grid.get('display') in ('grid', 'inline-grid'):
+            items = [child for child in flat.children(index)
+                     if is_grid_item(fields[child]) and isinstance(fields[child].get('grid'), dict)]
+            placements = _place_items(grid, [fields[child] for child in items], current_grid)
+            for child, (row, col, rows, cols) in zip(items, placements):
+                placed[child] = 1
+                pos_row[child], pos_col[child], row_span[child], col_span[child] = row, col, rows, cols
+        if first_child[index] >= 0:
+            contexts[index] = current_grid
+
+
+def _position_node(grid, parent_grid, placement):
+    """
+    Steps 1-3 of the position pass for one node's grid dict; placement is
+    the (row, col, row_span, col_span) its container gave it, if any.
+    Returns the node's grid context.
+    """
+    current_grid = {
+        'columns': parent_grid['columns'] if parent_grid else 1,
+        'rows': parent_grid['rows'] if parent_grid else 1,
+        'auto_flow': parent_grid.get('grid-auto-flow', 'row') if parent_grid else 'row'
+    }
+   
+    # 1. Normalize shorthand properties first
+    if 'grid-row' in grid:
+        start, end = _parse_grid_line(grid['grid-row'])
+        grid['grid-row-start'] = start
+        grid['grid-row-end'] = end
+        del grid['grid-row']
+   
+    if 'grid-column' in grid:
+        start, end = _parse_grid_line(grid['grid-column'])
+        grid['grid-column-start'] = start
+        grid['grid-column-end'] = end
+        del grid['grid-column']
+   
+    # 2. Grid items take the position their container's placement gave
+    #    them; other nodes fall back to the pos-row/pos-col counters
+    if placement is not None:
+        grid['pos-row'], grid['pos-col'], grid['pos-row-span'], grid['pos-col-span'] = placement
+    else:
+        _calculate_grid_position(grid, current_grid)
+   
+    # 3. Handle grid-auto-flow if present
+    if 'grid-auto-flow' in grid:
+        current_grid['auto_flow'] = grid['grid-auto-flow']
+    return current_grid
+
+
+def _place_items(grid, items, current_grid):
+    """
+    Placements of a container's items (components with a grid dict), recording
+    its parsed templates in current_grid
     """
+    columns, rows, areas = _template_tracks(grid)
+    current_grid['template_columns'] = columns
+    current_grid['template_rows'] = rows
+    current_grid['template_areas'] = areas
+    return place_grid_items([_item_lines(item) for item in items], columns, rows,
+                            grid.get('grid-auto-flow', 'row'), areas)
+
+
+def _calculate_grid_position(grid, parent_grid):
+    """Calculate pos-row and pos-col based on grid position properties"""
+   
+    # Default to auto placement
+    row_start = grid.get('grid-row-start', 'auto')
+    row_end = grid.get('grid-row-end', 'auto')
+    col_start = grid.get('grid-column-start', 'auto')
+    col_end = grid.get('grid-column-end', 'auto')
    
-    def _process_node(node, parent_grid=None):
-        if not isinstance(node, dict):
+    # Rule 1: Explicit position takes precedence
+    if all(p != 'auto' for p in [row_start, row_end, col_start, col_end]):
+        try:
+            grid['pos-row'] = int(row_start)
+            grid['pos-col'] = int(col_start)
             return
-    
-       
-        # Store parent grid info for reference
-        current_grid = {
-            'columns': parent_grid['columns'] if parent_grid else 1,
-            'rows': parent_grid['rows'] if parent_grid else 1,
-            'auto_flow': parent_grid.get('grid-auto-flow', 'row') if parent_grid else 'row'
-        }
-       
-        # 1. Normalize shorthand properties first
-        if 'grid-row' in grid:
-            start, end = _parse_grid_line(grid['grid-row'])
-            grid['grid-row-start'] = start
-            grid['grid-row-end'] = end
-            del grid['grid-row']
-       
-        if 'grid-column' in grid:
-            start, end = _parse_grid_line(grid['grid-column'])
-            grid['grid-column-start'] = start
-            grid['grid-column-end'] = end
-            del grid['grid-column']
-       
-        # 2. Calculate pos-row and pos-col based on position properties
-        _calculate_grid_position(node, current_grid)
-       
-        # 3. Handle grid-auto-flow if present
-        if 'grid-auto-flow' in grid:
-            current_grid['auto_flow'] = grid['grid-auto-flow']
-       
-        # Process children with current grid context
-        for child in node.get('component', []):
-            _process_node(child, current_grid)
+        except (ValueError, TypeError):
+            pass
    
-    def _calculate_grid_position(node, parent_grid):
-        """Calculate pos-row and pos-col based on grid position properties"""
-        grid = node.get('grid', {})
-       
-        # Default to auto placement
-        row_start = grid.get('grid-row-start', 'auto')
-        row_end = grid.get('grid-row-end', 'auto')
-        col_start = grid.get('grid-column-start', 'auto')
-        col_end = grid.get('grid-column-end', 'auto')
-       
-        # Rule 1: Explicit position takes precedence
-        if all(p != 'auto' for p in [row_start, row_end, col_start, col_end]):
-            try:
-                grid['pos-row'] = int(row_start)
-                grid['pos-col'] = int(col_start)
-                return
-            except (ValueError, TypeError):
-                pass
-       
-        # Rule 2: Handle span values
-        if isinstance(row_start, str) and row_start.startswith('span'):
-            grid['pos-row'] = 1  # Default row for span
-        if isinstance(col_start, str) and col_start.startswith('span'):
-            grid['pos-col'] = 1  # Default column for span
-       
-        # Rule 3: Auto placement based on parent's grid-auto-flow
-        if parent_grid['auto_flow'] == 'column':
-            # Column-major order
-            grid['pos-row'] = 1
-            if 'pos-col' not in grid:
-                grid['pos-col'] = parent_grid['columns'] + 1
-                parent_grid['columns'] += 1
-        else:
-            # Row-major order (default)
-            grid['pos-col'] = 1
-            if 'pos-row' not in grid:
-                grid['pos-row'] = parent_grid['rows'] + 1
-                parent_grid['rows'] += 1
-       
-        # Rule 4: Handle partially specified positions
-        if row_start != 'auto' and col_start == 'auto':
-            try:
-                grid['pos-row'] = int(row_start)
-                grid['pos-col'] = 1  # Start new row
-            except (ValueError, TypeError):
-                pass
-       
-        if col_start != 'auto' and row_start == 'auto':
-            try:
-                grid['pos-col'] = int(col_start)
-                grid['pos-row'] = 1  # Start new column
-            except (ValueError, TypeError):
-                pass
+    # Rule 2: Handle span values
+    if isinstance(row_start, str) and row_start.startswith('span'):
+        grid['pos-row'] = 1  # Default row for span
+    if isinstance(col_start, str) and col_start.startswith('span'):
+        grid['pos-col'] = 1  # Default column for span
+   
+    # Rule 3: Auto placement based on parent's grid-auto-flow
+    if parent_grid['auto_flow'] == 'column':
+        # Column-major order
+        grid['pos-row'] = 1
+        if 'pos-col' not in grid:
+            grid['pos-col'] = parent_grid['columns'] + 1
+            parent_grid['columns'] += 1
+    else:
+        # Row-major order (default)
+        grid['pos-col'] = 1
+        if 'pos-row' not in grid:
+            grid['pos-row'] = parent_grid['rows'] + 1
+            parent_grid['rows'] += 1
    
-    def _parse_grid_line(line_value):
-        """Converts shorthand like '1 / 3' → (1, 3) or 'span 2' → (auto, span 2)"""
-        if isinstance(line_value, str):
-            if '/' in line_value:
-                start, end = line_value.split('/', 1)
-                return start.strip(), end.strip()
-            elif line_value.startswith('span'):
-                return ('auto', line_value)
-        return (line_value, line_value + 1)
+    # Rule 4: Handle partially specified positions
+    if row_start != 'auto' and col_start == 'auto':
+        try:
+            grid['pos-row'] = int(row_start)
+            grid['pos-col'] = 1  # Start new row
+        except (ValueError, TypeError):
+            pass
    
-    _process_node(dom_tree)
-    return dom_tree
+    if col_start != 'auto' and row_start == 'auto':
+        try:
+            grid['pos-col'] = int(col_start)
+            grid['pos-row'] = 1  # Start new column
+        except (ValueError, TypeError):
+            pass
+
+
+def _parse_grid_line(line_value):
+    """Converts shorthand like '1 / 3' → (1, 3), 'span 2' → (auto, span 2) or '2' → (2, auto)"""
+    if isinstance(line_value, str):
+        if '/' in line_value:
+            start, end = line_value.split('/', 1)
+            return start.strip(), end.strip()
+        elif line_value.startswith('span'):
+            return ('auto', line_value)
+        line_value = line_value.strip()
+        # A lone line name also names the end line; anything else ends at auto
+        if LINE_NAME_RE.fullmatch(line_value) and line_value != 'auto':
+            return (line_value, line_value)
+        return (line_value, 'auto')
+    return (line_value, line_value + 1)
+
+
+def _template_tracks(grid):
+    """
+    (columns, rows, areas) of a container: its TrackLists and TemplateAreas,
+    read from the longhands or from grid-template
+    """
+    columns = template_tracks(grid, 'grid-template-columns')
+    rows = template_tracks(grid, 'grid-template-rows')
+    areas = grid.get('grid-template-areas')
+    template = grid.get('grid-template')
+    if isinstance(template, str) and (columns is None or rows is None or areas is None):
+        rows_part, _, columns_part = template.partition('/')
+        template_areas, rows_part = split_template_rows(rows_part)
+        if areas is None:
+            areas = template_areas
+        if rows is None and rows_part.strip():
+            rows = parse_track_list(rows_part)
+        if columns is None and columns_part.strip():
+            columns = parse_track_list(columns_part)
+    return columns, rows, parse_template_areas(areas) if areas is not None else None
+
+
+def _item_lines(item):
+    """
+    (row-start, row-end, column-start, column-end) of a grid item. Placement
+    properties are read from its style dict (where to_json puts them), then
+    from its grid dict; grid-row/grid-column win over grid-area, and the
+    longhands over both.
+    """
+    lines = ['auto', 'auto', 'auto', 'auto']
+    for source in (item.get('style'), item['grid']):
+        if not isinstance(source, dict):
+            continue
+        if 'grid-area' in source:
+            lines = list(_parse_grid_area(source['grid-area']))
+        for offset, axis in ((0, 'row'), (2, 'column')):
+            if f'grid-{axis}' in source:
+                lines[offset:offset + 2] = _parse_grid_line(source[f'grid-{axis}'])
+            lines[offset] = source.get(f'grid-{axis}-start', lines[offset])
+            lines[offset + 1] = source.get(f'grid-{axis}-end', lines[offset + 1])
+    return tuple(lines)
+
+
+def _parse_grid_area(area_value):
+    """
+    Converts grid-area 'header' or '1 / 2 / 3 / 4' (row-start / column-start
+    / row-end / column-end) to (row-start, row-end, column-start, column-end).
+    Omitted values repeat a line name given for the opposite edge, else auto.
+    """
+    if not isinstance(area_value, str):
+        return ('auto', 'auto', 'auto', 'auto')
+    values = [value.strip() for value in area_value.split('/')][:4]
+
+    def _is_name(value):
+        return bool(LINE_NAME_RE.fullmatch(value)) and value not in ('auto', 'span')
+
+    row_start = values[0] or 'auto'
+    column_start = values[1] if len(values) > 1 else row_start if _is_name(row_start) else 'auto'
+    row_end = values[2] if len(values) > 2 else row_start if _is_name(row_start) else 'auto'
+    column_end = values[3] if len(values) > 3 else column_start if _is_name(column_start) else 'auto'
+    return (row_start, row_end, column_start, column_end)
+
+
+def process_position_properties(dom_tree):
+    """
+    Processes all position-related grid properties and calculates pos-row/pos-col
+    based on grid positioning behavior.
+    """
+    return GridPipeline([position_grid_node]).run(dom_tree)
+
+
+# Alignment, sizing and position run per node in one traversal. Extra passes
+# added with register_grid_pass() join that traversal after these three.
+GRID_PASSES = GridPipeline([align_grid_node, size_grid_node, position_grid_node])
+
+
+def register_grid_pass(handler):
+    """Add a pass to the pipeline used by process_grid_positions"""
+    return GRID_PASSES.register(handler)
+
  
-def process_grid_positions(input_json):
+def _copy_on_write(node):
+    """
+    Shallow copy of a node holding only what the grid passes write to: the
+    node dict itself, its grid dict (every pass writes there, position
+    always sets pos-row/pos-col) and its style dict only when it carries
+    self-alignment properties to move. Everything else is shared.
+    """
+    if not isinstance(node, dict):
+        return node
+    node = dict(node)
+    if isinstance(node.get('grid'), dict):
+        node['grid'] = dict(node['grid'])
+    style = node.get('style')
+    if isinstance(style, dict) and any(prop in style for prop in SELF_ALIGNMENT_PROPS):
+        node['style'] = dict(style)
+    return node
+
+
+def run_grid_passes_flat(flat):
+    """
+    Alignment, sizing and position over a FlatDOM, in place. Each pass runs
+    over the whole tree in turn, which gives the same result as the fused
+    walk. Passes added with register_grid_pass() are not run.
+    """
+    align_grid_flat(flat)
+    size_grid_flat(flat)
+    position_grid_flat(flat)
+    return flat
+
+
+def process_grid_positions_flat(input_json):
+    """
+    process_grid_positions() on the columnar FlatDOM form: the same output,
+    with input_json left as it is (copy-on-write, like copy_mode="cow").
+    """
+    if not isinstance(input_json, dict):
+        raise ValueError("Input must be a JSON-compatible dictionary")
+    with stage("process_grid_positions"):
+        flat = run_grid_passes_flat(FlatDOM.from_json(input_json, _copy_on_write))
+        output = flat.to_json()
+        extra = GRID_PASSES.handlers[3:]
+        if extra:
+            # Later passes only see the tree as the built-in ones left it
+            GridPipeline(extra).run(output)
+    return output
+
+
+def process_grid_positions(input_json, copy_mode="deepcopy"):
     """
     Processes grid position properties in a DOM tree JSON and returns the modified JSON
     with calculated pos-row and pos-col values.
 
     Args:
         input_json: Input DOM tree as a JSON-compatible dictionary
+        copy_mode: How the input is protected from modification:
+            "deepcopy" - process a full deep copy (default; made with an
+                         explicit stack, so any depth works)
+            "cow"      - copy-on-write; only node dicts, component lists and the
+                         dicts the passes modify are cloned, the rest is shared
+                         with input_json
+            "inplace"  - modify and return input_json itself
 
     Returns:
         dict: Modified DOM tree with grid position properties normalized
@@ -129,18 +348,19 @@ def process_grid_positions(input_json):
     if not isinstance(input_json, dict):
         raise ValueError("Input must be a JSON-compatible dictionary")
 
-    dom_tree = copy.deepcopy(input_json)
-
-    # Step 1: Process alignment properties (align-items, justify-items, etc.)
-    process_grid_alignment(dom_tree)
-
-    # Step 2: Process sizing properties (grid-template-rows, grid-auto-rows, etc.)
-    process_grid_sizing(dom_tree)
-
-    # Step 3: Process position properties (grid-row-start, pos-row, etc.)
-    processed_tree = process_position_properties(dom_tree)
-
-    return processed_tree
+    # Alignment (align-items, justify-items, etc.), sizing (grid-template-rows,
+    # grid-auto-rows, etc.) and position (grid-row-start, pos-row, etc.) are
+    # applied to each node in turn during a single walk of the tree.
+    if copy_mode not in ("deepcopy", "cow", "inplace"):
+        raise ValueError(f"Unknown copy_mode: {copy_mode!r}")
+    with stage("process_grid_positions"):
+        if copy_mode == "deepcopy":
+            with stage("deepcopy"):
+                input_json = copy_json(input_json)
+            return GRID_PASSES.run(input_json)
+        if copy_mode == "cow":
+            return GRID_PASSES.run(input_json, copy_node=_copy_on_write)
+        return GRID_PASSES.run(input_json)
 
  
 def process_dom_file(input_file="sizetest.json", output_file="sizetestoutput.json"):
@@ -160,7 +380,7 @@ def process_dom_file(input_file="sizetest.json", output_file="sizetestoutput.jso
         print(json.dumps(dom_tree, indent=2, ensure_ascii=False))
        
         # Compute positions and modify the DOM tree
-        modified_dom = process_grid_positions(dom_tree)
+        modified_dom = process_grid_positions(dom_tree, copy_mode="inplace")
        
         # Save to output JSON file
         with open(output_file, 'w', encoding='utf-8') as f:
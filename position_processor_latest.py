@@ -1,3 +1,6 @@
+from grid_tracks import template_tracks
+
+
 def process_position_properties(dom_tree):
     """Enhanced grid position processor with proper implicit grid handling"""
  
@@ -17,7 +20,7 @@ def process_position_properties(dom_tree):
             'auto_flow': grid.get('grid-auto-flow',
                                 parent_grid['auto_flow'] if parent_grid else 'row'),
             'is_grid_container': grid.get('display') == 'grid',
-            'max_columns': _get_max_columns(grid)
+            'max_columns': _get_max_columns(grid) if grid.get('display') == 'grid' else None
         }
  
         # Normalize shorthand properties
@@ -96,17 +99,9 @@ def process_position_properties(dom_tree):
  
     def _get_max_columns(grid):
         """Extracts column count from grid properties"""
-        if 'grid-template-columns' in grid:
-            parts = grid['grid-template-columns'].split()
-            if 'repeat(' in parts[0]:
-                try:
-                    return int(parts[0].split('(')[1].split(',')[0])
-                except (IndexError, ValueError):
-                    pass
-            return len(parts)
-       
-        # No explicit columns - implicit grid
-        return None
+        tracks = template_tracks(grid, 'grid-template-columns')
+        # None indicates an implicit grid (or an auto-fill/auto-fit repeat)
+        return tracks.count if tracks is not None else None
  
     def _parse_grid_line(line_value):
         """Converts shorthand grid lines"""
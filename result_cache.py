@@ -0,0 +1,179 @@
+# result_cache.py
+"""
+Content-addressed on-disk cache for HTML+CSS -> grid JSON conversions.
+
+Entries are keyed by a hash of the HTML bytes, the CSS bytes, the pipeline
+version and the conversion options, so a hit is only possible when the
+output would be identical. Outputs are made reproducible by drawing auto_
+names from a generator seeded with the options' seed, or by a
+deterministic naming scheme.
+
+The cache is safe to share between processes: entries are written to a
+temporary file and renamed into place, so readers never see partial files,
+and eviction runs under an exclusive lock file where the platform has one.
+Hits refresh an entry's modification time, which eviction uses as its
+least-recently-used order.
+"""
+import hashlib
+import json
+import os
+import random
+import tempfile
+
+from dom_linegap import CSSParser, convert_document
+from traversal import dumps_json
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+# Bump whenever a pipeline change alters the output for the same input
+PIPELINE_VERSION = "5"
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# Each process scans for eviction once per this many stores, so the cache
+# may briefly exceed max_bytes by up to that many entries per writer
+EVICT_INTERVAL = 32
+
+
+class ResultCache:
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._puts = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(html_bytes, css_bytes, options=None):
+        """Cache key for one conversion"""
+        digest = hashlib.sha256()
+        header = json.dumps({"version": PIPELINE_VERSION, "options": options or {}},
+                            sort_keys=True)
+        for part in (header.encode("utf-8"), html_bytes, css_bytes):
+            digest.update(len(part).to_bytes(8, "big"))
+            digest.update(part)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def get(self, key):
+        """Stored (output_text, errors) for key, or None on a miss"""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                header = f.readline()
+                output_text = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None  # never stored, or evicted by another process
+        return output_text, json.loads(header)
+
+    def put(self, key, output_text, errors=()):
+        """Store a conversion result, evicting old entries now and then"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(json.dumps(list(errors)) + "\n")
+                f.write(output_text)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        self._puts += 1
+        if self._puts % EVICT_INTERVAL == 1:
+            self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits max_bytes"""
+        with self._lock():
+            entries = []
+            total = 0
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    if not name.endswith(".json"):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+                    total += stat.st_size
+            if total <= self.max_bytes:
+                return
+            entries.sort()
+            for _, size, path in entries:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def _lock(self):
+        return _FileLock(os.path.join(self.directory, ".lock"))
+
+
+class _FileLock:
+    """Exclusive inter-process lock; a no-op where fcntl is unavailable"""
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+
+
+def cached_convert(html_bytes, css_bytes, cache, seed=0, indent=2, stylesheet=None, names=None):
+    """
+    Convert an HTML/CSS pair through the cache.
+
+    Args:
+        html_bytes: UTF-8 HTML document (bytes or an mmap)
+        css_bytes: UTF-8 stylesheet
+        cache: ResultCache to read from and store into
+        seed: Seed for auto_ names, making the output reproducible
+        indent: JSON indentation of the stored output
+        stylesheet: Compiled form of css_bytes, or a callable returning it,
+                    used on a miss instead of compiling css_bytes
+        names: Naming scheme for auto_ names (see node_names); seed only
+               matters for the default random scheme
+
+    Returns:
+        tuple: (output JSON text, list of HTML validation errors, hit flag)
+    """
+    options = {"seed": seed, "indent": indent}
+    if names is not None and names != "random":
+        options = {"names": names, "indent": indent}
+    key = cache.key(html_bytes, css_bytes, options)
+    stored = cache.get(key)
+    if stored is not None:
+        return stored[0], stored[1], True
+
+    if stylesheet is None:
+        stylesheet = CSSParser(css_bytes.decode("utf-8")).compile()
+    elif callable(stylesheet):
+        stylesheet = stylesheet()
+    output, errors = convert_document(html_bytes, stylesheet,
+                                      random.Random(seed), names)
+    output_text = dumps_json(output, indent=indent)
+    cache.put(key, output_text, errors)
+    return output_text, errors, False
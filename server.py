@@ -0,0 +1,362 @@
+# server.py
+"""
+Warm local conversion service.
+
+An asyncio HTTP/1.1 server on localhost (or a Unix socket) that converts
+HTML to grid JSON without paying interpreter start-up per document. The
+conversions themselves run on a pool of worker processes that stay up, each
+keeping compiled stylesheets keyed by a hash of their text, so a stylesheet
+is compiled once per worker however many documents use it.
+
+    python server.py --port 8765 --stylesheet shared=shared.css
+    curl --data-binary @page.html "http://127.0.0.1:8765/convert?stylesheet=shared"
+
+Endpoints:
+    POST /convert?stylesheet=NAME   body: HTML, converted with a registered stylesheet
+    POST /convert                   body: JSON {"html": ..., "css": ...} or
+                                    {"html": ..., "stylesheet": NAME}; optional "seed"
+                                    and "names" (naming scheme, see node_names)
+    PUT /stylesheets/NAME           body: CSS, registers or replaces a stylesheet
+    GET /health                     registered stylesheets and pending conversions
+
+Responses are JSON: {"output": ..., "errors": [...]} for conversions,
+{"error": message} with a 4xx/5xx status otherwise. At most --max-pending
+conversions are queued or running; further requests get 503 at once rather
+than piling up, and a conversion that takes longer than --timeout seconds
+gets 504.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from dom_linegap import CSSParser, convert_document
+from node_names import NAMING_SCHEMES
+from traversal import dumps_json
+
+DEFAULT_PORT = 8765
+DEFAULT_MAX_PENDING = 64
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_MAX_BODY = 64 * 1024 * 1024
+# Compiled stylesheets kept per worker process
+WORKER_STYLESHEETS = 32
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 500: "Internal Server Error",
+               503: "Service Unavailable", 504: "Gateway Timeout"}
+
+# Compiled stylesheets, per worker process, keyed by CSS digest
+_worker_stylesheets = {}
+
+
+def _css_digest(css):
+    return hashlib.sha256(css.encode("utf-8")).hexdigest()
+
+
+def _compiled(digest, css):
+    stylesheet = _worker_stylesheets.pop(digest, None)
+    if stylesheet is None:
+        stylesheet = CSSParser(css).compile()
+        if len(_worker_stylesheets) >= WORKER_STYLESHEETS:
+            del _worker_stylesheets[next(iter(_worker_stylesheets))]
+    _worker_stylesheets[digest] = stylesheet  # most recently used last
+    return stylesheet
+
+
+def _init_worker(stylesheets):
+    """Compile the stylesheets registered at start-up before the first request"""
+    for digest, css in stylesheets:
+        _compiled(digest, css)
+
+
+def _convert(html, digest, css, seed, names):
+    """
+    Worker side of one conversion: (output JSON text, HTML errors), or
+    None when css is None and this worker has not compiled digest yet
+    """
+    if css is None and digest not in _worker_stylesheets:
+        return None
+    rng = random.Random(seed) if seed is not None else None
+    output, errors = convert_document(html, _compiled(digest, css), rng, names)
+    return dumps_json(output), errors
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ConversionServer:
+    """
+    Request handling and the worker pool behind it.
+
+    Args:
+        stylesheets: Initial {name: CSS text} registry
+        workers: Worker processes (default: CPU count)
+        max_pending: Conversions allowed to be queued or running at once,
+                     timed-out ones included until their worker is done
+        timeout: Seconds a conversion may take before the request gets 504
+        max_body: Largest accepted request body, in bytes
+    """
+
+    def __init__(self, stylesheets=None, workers=None, max_pending=DEFAULT_MAX_PENDING,
+                 timeout=DEFAULT_TIMEOUT, max_body=DEFAULT_MAX_BODY):
+        self.stylesheets = {}      # name -> (digest, CSS text)
+        for name, css in (stylesheets or {}).items():
+            self.stylesheets[name] = (_css_digest(css), css)
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.max_body = max_body
+        self.pending = 0
+        self.executor = None
+
+    def start_pool(self):
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                            initargs=(list(self.stylesheets.values()),))
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    async def convert(self, html, digest, css, seed=None, names=None):
+        """Run one conversion on the pool, subject to backpressure and the timeout"""
+        if self.pending >= self.max_pending:
+            raise HTTPError(503, f"Too many pending conversions ({self.max_pending})")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        # Only the digest goes to the worker; the CSS text follows only if
+        # that worker has not compiled the stylesheet yet
+        result = await self._submit(loop, deadline, html, digest, None, seed, names)
+        if result is None:
+            result = await self._submit(loop, deadline, html, digest, css, seed, names)
+        return result
+
+    async def _submit(self, loop, deadline, *args):
+        work = self.executor.submit(_convert, *args)
+        self.pending += 1
+        # The worker cannot be interrupted: a timed-out conversion keeps its
+        # worker busy until it finishes, so it stays pending until then
+        work.add_done_callback(lambda _: loop.call_soon_threadsafe(self._finished))
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(work), max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            raise HTTPError(504, f"Conversion took longer than {self.timeout:g}s")
+
+    def _finished(self):
+        self.pending -= 1
+
+    async def handle(self, method, target, headers, body):
+        """(status, response object) for one request"""
+        url = urlsplit(target)
+        path = unquote(url.path)
+        query = parse_qs(url.query)
+
+        if path == "/health":
+            if method != "GET":
+                raise HTTPError(405, "Use GET")
+            return 200, {"ok": True, "stylesheets": sorted(self.stylesheets),
+                         "pending": self.pending, "max_pending": self.max_pending}
+
+        if path.startswith("/stylesheets/"):
+            name = path[len("/stylesheets/"):]
+            if method != "PUT":
+                raise HTTPError(405, "Use PUT")
+            if not name:
+                raise HTTPError(400, "Missing stylesheet name")
+            css = _decode(body)
+            self.stylesheets[name] = (_css_digest(css), css)
+            return 200, {"name": name, "sha256": self.stylesheets[name][0]}
+
+        if path == "/convert":
+            if method != "POST":
+                raise HTTPError(405, "Use POST")
+            if headers.get("content-type", "").split(";")[0].strip() == "application/json":
+                try:
+                    request = json.loads(body)
+                except ValueError as e:
+                    raise HTTPError(400, f"Invalid JSON: {e}")
+                if not isinstance(request, dict) or not isinstance(request.get("html"), str):
+                    raise HTTPError(400, 'Expected {"html": ..., "css" or "stylesheet": ...}')
+                html = request["html"]
+                css, name, seed = request.get("css"), request.get("stylesheet"), request.get("seed")
+                names = request.get("names")
+            else:
+                html = _decode(body)
+                css = None
+                name = query.get("stylesheet", [None])[0]
+                seed = query.get("seed", [None])[0]
+                names = query.get("names", [None])[0]
+            if seed is not None:
+                try:
+                    seed = int(seed)
+                except (TypeError, ValueError):
+                    raise HTTPError(400, "seed must be an integer")
+            if names is not None and names not in NAMING_SCHEMES:
+                raise HTTPError(400, f"names must be one of {', '.join(NAMING_SCHEMES)}")
+
+            if isinstance(css, str):
+                digest = _css_digest(css)
+            elif name is not None:
+                if name not in self.stylesheets:
+                    raise HTTPError(404, f"Unknown stylesheet: {name}")
+                digest, css = self.stylesheets[name]
+            else:
+                raise HTTPError(400, "Give css or a registered stylesheet name")
+            output_text, errors = await self.convert(html, digest, css, seed, names)
+            return 200, _RawOutput(output_text, errors)
+
+        raise HTTPError(404, f"No such endpoint: {path}")
+
+    async def serve_client(self, reader, writer):
+        """Serve requests on one connection until the client closes it"""
+        try:
+            while True:
+                request = await _read_request(reader, self.max_body)
+                if request is None:
+                    break
+                method, target, headers, body, keep_alive = request
+                try:
+                    status, response = await self.handle(method, target, headers, body)
+                except HTTPError as e:
+                    status, response = e.status, {"error": str(e)}
+                except Exception as e:
+                    status, response = 500, {"error": f"{type(e).__name__}: {e}"}
+                _write_response(writer, status, response, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except HTTPError as e:
+            # The request could not be read, so the connection is unusable
+            _write_response(writer, e.status, {"error": str(e)}, False)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+class _RawOutput:
+    """Conversion result whose output is already JSON text"""
+
+    __slots__ = ("output_text", "errors")
+
+    def __init__(self, output_text, errors):
+        self.output_text = output_text
+        self.errors = errors
+
+    def encode(self):
+        return (f'{{"output": {self.output_text}, "errors": {json.dumps(self.errors)}}}'
+                .encode("utf-8"))
+
+
+def _decode(body):
+    try:
+        return body.decode("utf-8")
+    except UnicodeDecodeError as e:
+        raise HTTPError(400, f"Body is not UTF-8: {e}")
+
+
+async def _read_request(reader, max_body):
+    """(method, target, headers, body, keep_alive), or None at end of stream"""
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if not line:
+            raise asyncio.IncompleteReadError(b"", None)
+        if line in (b"\r\n", b"\n"):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        headers[key.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPError(400, "Invalid Content-Length")
+    if length > max_body:
+        raise HTTPError(413, f"Body larger than {max_body} bytes")
+    body = await reader.readexactly(length) if length else b""
+
+    connection = headers.get("connection", "").lower()
+    keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+    return method.upper(), target, headers, body, keep_alive
+
+
+def _write_response(writer, status, response, keep_alive):
+    if isinstance(response, _RawOutput):
+        payload = response.encode()
+    else:
+        payload = json.dumps(response).encode("utf-8")
+    head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    writer.write(head.encode("latin-1") + payload)
+
+
+async def serve(server, host="127.0.0.1", port=DEFAULT_PORT, unix_socket=None):
+    """Run server until cancelled"""
+    server.start_pool()
+    try:
+        if unix_socket:
+            listener = await asyncio.start_unix_server(server.serve_client, path=unix_socket)
+            where = unix_socket
+        else:
+            listener = await asyncio.start_server(server.serve_client, host, port)
+            where = ", ".join(f"{sock.getsockname()[0]}:{sock.getsockname()[1]}"
+                              for sock in listener.sockets)
+        print(f"Serving conversions on {where}")
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve HTML -> grid JSON conversions from warm workers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix-socket", help="Listen on this Unix socket instead of TCP")
+    parser.add_argument("--stylesheet", action="append", default=[], metavar="NAME=CSS_FILE",
+                        help="Register a stylesheet at start-up (repeatable)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--max-pending", type=int, default=DEFAULT_MAX_PENDING,
+                        help="Conversions queued or running before requests get 503")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help="Seconds per conversion before the request gets 504")
+    parser.add_argument("--max-body", type=int, default=DEFAULT_MAX_BODY // (1024 * 1024),
+                        help="Largest request body in MiB")
+    args = parser.parse_args(argv)
+
+    stylesheets = {}
+    for entry in args.stylesheet:
+        name, sep, css_file = entry.partition("=")
+        if not sep or not name:
+            parser.error(f"--stylesheet expects NAME=CSS_FILE, got {entry!r}")
+        with open(css_file, "r", encoding="utf-8") as f:
+            stylesheets[name] = f.read()
+
+    server = ConversionServer(stylesheets, args.workers, args.max_pending, args.timeout,
+                              args.max_body * 1024 * 1024)
+    try:
+        asyncio.run(serve(server, args.host, args.port, args.unix_socket))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
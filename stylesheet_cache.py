@@ -0,0 +1,106 @@
+# stylesheet_cache.py
+"""
+On-disk cache of compiled stylesheets.
+
+A CompiledStylesheet (rules in order, the id/class/tag index and the
+converted declarations) is pickled to <cache_dir>/<sha256 of the CSS>-<base_px>.pickle,
+so a later run loads it with one read instead of tokenizing and converting
+the CSS again.
+
+Every file starts with a header naming the format version and a fingerprint
+of the compiler's source (dom_linegap.py, colors.py). A file whose header or
+CSS digest does not match, or that fails to unpickle, is treated as a miss:
+the stylesheet is recompiled and the file rewritten. Files are written to a
+temporary name and renamed into place, so concurrent runs never read a
+partial file.
+
+The cache is unpickled without validation, so only point it at directories
+this user controls.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+
+import colors
+import dom_linegap
+from dom_linegap import CSSParser
+
+# Bump when the layout of the cached object changes
+CACHE_FORMAT = 1
+_MAGIC = b"grid-stylesheet-cache"
+
+_fingerprint = None
+
+
+def compiler_fingerprint():
+    """Hash of the modules that produce a CompiledStylesheet"""
+    global _fingerprint
+    if _fingerprint is None:
+        digest = hashlib.sha256(str(CACHE_FORMAT).encode("ascii"))
+        for module in (dom_linegap, colors):
+            with open(module.__file__, "rb") as f:
+                digest.update(f.read())
+        _fingerprint = digest.hexdigest()
+    return _fingerprint
+
+
+def load_stylesheet(css, cache_dir, base_px=16):
+    """
+    Compiled form of css, from cache_dir when possible.
+
+    Args:
+        css: Stylesheet text
+        cache_dir: Cache directory (created if missing)
+        base_px: Pixel size of 1em/1rem, part of the cache key
+
+    Returns:
+        tuple: (CompiledStylesheet, list of CSS parse errors, hit flag)
+    """
+    css_digest = hashlib.sha256(css.encode("utf-8")).hexdigest()
+    path = os.path.join(cache_dir, f"{css_digest}-{base_px}.pickle")
+    header = b"%s %s %s\n" % (_MAGIC, compiler_fingerprint().encode("ascii"),
+                              css_digest.encode("ascii"))
+
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        data = None
+    if data is not None and data.startswith(header):
+        try:
+            stylesheet, errors = pickle.loads(memoryview(data)[len(header):])
+            return stylesheet, errors, True
+        except Exception:
+            pass  # corrupt or written by an incompatible Python; rebuild
+
+    css_parser = CSSParser(css)
+    stylesheet = css_parser.compile(base_px)
+    errors = css_parser.errors
+    try:
+        _write(path, header + pickle.dumps((stylesheet, errors), pickle.HIGHEST_PROTOCOL))
+    except OSError:
+        pass  # an unwritable cache only costs the next run a compile
+    return stylesheet, errors, False
+
+
+def load_stylesheet_file(css_file, cache_dir, base_px=16):
+    """load_stylesheet() for the contents of css_file"""
+    with open(css_file, "r", encoding="utf-8") as f:
+        return load_stylesheet(f.read(), cache_dir, base_px)
+
+
+def _write(path, data):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
@@ -0,0 +1,49 @@
+# test_ancestor_filter.py
+"""
+Tests for the ancestor Bloom filter: apply_styles() must give every node
+of a generated document the same styles as a walk that tests every
+candidate rule without the filter.
+
+    python -m pytest -q test_ancestor_filter.py
+"""
+import pytest
+
+from benchmark import generate_document
+from dom_linegap import CSSParser, CompiledStylesheet, HTMLNode, HTMLParser
+from traversal import walk
+
+
+def style_mismatches(html, css):
+    """Number of nodes whose styles differ with and without the ancestor filter"""
+    stylesheet = CompiledStylesheet(CSSParser(css).parse())
+    filtered = HTMLParser(html).parse()
+    filtered.apply_styles(stylesheet)
+    plain = HTMLParser(html).parse()
+    walk(plain, HTMLNode._enter_styles, state=stylesheet)
+
+    mismatches = 0
+    stack = [(filtered, plain)]
+    while stack:
+        node, expected = stack.pop()
+        if dict(node.styles) != dict(expected.styles):
+            mismatches += 1
+        stack.extend(zip(node.children or (), expected.children or ()))
+    return mismatches
+
+
+@pytest.mark.parametrize("numeric_ids", [False, True], ids=["named ids", "numeric ids"])
+@pytest.mark.parametrize("nodes, seed", [(1000, 0), (4000, 1)])
+def test_filter_keeps_styles(nodes, seed, numeric_ids):
+    html, css = generate_document(nodes=nodes, numeric_ids=numeric_ids, seed=seed)
+    assert style_mismatches(html, css) == 0
+
+
+@pytest.mark.parametrize("numeric_ids", [False, True], ids=["named ids", "numeric ids"])
+def test_filter_keeps_styles_with_class_and_id_ancestors(numeric_ids):
+    # The generator's descendant selectors only have tag ancestors
+    html, css = generate_document(nodes=2000, numeric_ids=numeric_ids, seed=2)
+    prefix = "" if numeric_ids else "n"
+    css += "".join(f".c{i} .c{i + 1} {{ color: red }}\n.c{i} div {{ margin: {i}px }}\n"
+                   for i in range(20))
+    css += "".join(f"#{prefix}{i} .c{i % 7} {{ padding: 1px }}\n" for i in range(0, 400, 3))
+    assert style_mismatches(html, css) == 0
@@ -0,0 +1,128 @@
+# test_css_parser.py
+"""
+Tests for CSSParser: rules, at-rules, strings, escapes, comments, error
+positions, and the regex fast paths agreeing with the full scanner.
+
+    python -m pytest -q test_css_parser.py
+"""
+import random
+
+import pytest
+
+from dom_linegap import CSSParser, convert_document
+
+
+def parse(css):
+    parser = CSSParser(css)
+    return parser.parse_rules(), parser.errors
+
+
+def test_selector_lists_share_declarations():
+    rules, errors = parse("h1, .title ,#main { color: red; margin: 0 4px }")
+    assert rules == [("h1", {"color": "red", "margin": "0 4px"}),
+                     (".title", {"color": "red", "margin": "0 4px"}),
+                     ("#main", {"color": "red", "margin": "0 4px"})]
+    assert errors == []
+
+
+def test_repeated_selectors_cascade_in_source_order():
+    css = ".x { color: red; margin: 1px } .x { color: blue }"
+    assert CSSParser(css).parse() == [(".x", {"color": "red", "margin": "1px"}),
+                                      (".x", {"color": "blue"})]
+    output, _ = convert_document('<html><body><div class="x" id="k">t</div></body></html>',
+                                 CSSParser(css).compile())
+    assert output["component"][0]["style"] == {"color": "#0000ff", "margin": "1px"}
+
+
+def test_nested_at_rules_are_skipped():
+    rules, errors = parse("@media (min-width: 1px) { a { color: red } "
+                          "@supports (x: y) { b { c: d } } }\n"
+                          '@import "a;b}";\n'
+                          "@charset 'x';\n"
+                          "p { margin: 0 }")
+    assert rules == [("p", {"margin": "0"})]
+    assert errors == []
+
+
+def test_strings_keep_their_delimiters_and_contents():
+    rules, errors = parse("""a { content: "};{"; quotes: '"' "'" }""")
+    assert rules == [("a", {"content": '"};{"', "quotes": """'"' "'" """.strip()})]
+    assert errors == []
+
+
+def test_string_in_attribute_selector():
+    rules, _ = parse("a[title='1,2'], input[type=\"a{b\"] { c: d }")
+    assert [selector for selector, _ in rules] == ["a[title='1,2']", 'input[type="a{b"]']
+
+
+def test_escapes():
+    rules, errors = parse(r".a\{b, .c\;d, .e\,f { x: \"y }")
+    assert rules == [(r".a\{b", {"x": r"\"y"}), (r".c\;d", {"x": r"\"y"}),
+                     (r".e\,f", {"x": r"\"y"})]
+    assert errors == []
+
+
+def test_brackets_hold_separators():
+    rules, errors = parse("a { b: url(x;y); c: f(g(h;i)); d: [e;f] }")
+    assert rules == [("a", {"b": "url(x;y)", "c": "f(g(h;i))", "d": "[e;f]"})]
+    assert errors == []
+
+
+def test_comments_are_dropped():
+    rules, errors = parse("/* { */ a /* , b */ { c: d /* ; e: f */ ; /**/ g: h }")
+    assert rules == [("a", {"c": "d", "g": "h"})]
+    assert errors == []
+
+
+@pytest.mark.parametrize("css, rules, errors", [
+    ("a { color: red; }\n}\nb { x }",
+     [("a", {"color": "red"}), ("b", {})],
+     ["CSS error at line 2, column 1: Unexpected '}'",
+      "CSS error at line 3, column 5: Invalid declaration 'x'"]),
+    ("a {\n  b { c: d }\n  e: f\n}",
+     [("a", {"e": "f"})],
+     ["CSS error at line 2, column 3: Nested rule ignored"]),
+    ('a { x: "open\n}',
+     [("a", {"x": '"open'})],
+     ["CSS error at line 1, column 8: Unclosed string"]),
+    ("p {}\na { c: d",
+     [("p", {}), ("a", {"c": "d"})],
+     ["CSS error at line 2, column 3: Unclosed declaration block"]),
+    ("a, b", [], ["CSS error at line 1, column 1: Selector without a declaration block"]),
+    ("a;\nb { c: d }", [("b", {"c": "d"})],
+     ["CSS error at line 1, column 2: Expected '{' after selector, found ';'"]),
+    ("a { c: d }\n  /* x", [("a", {"c": "d"})], ["CSS error at line 2, column 3: Unclosed comment"]),
+    ("@media x {\n a { }", [], ["CSS error at line 1, column 10: Unclosed block"]),
+    ("@import 'x'", [], ["CSS error at line 1, column 1: Unterminated at-rule"]),
+    ("a { : d; c: e }", [("a", {"c": "e"})], ["CSS error at line 1, column 5: Invalid declaration ': d'"]),
+])
+def test_errors_report_line_and_column(css, rules, errors):
+    assert parse(css) == (rules, errors)
+
+
+def test_crlf_line_endings():
+    _, errors = parse("a { c: d }\r\nb { x }\r\n")
+    assert errors == ["CSS error at line 2, column 5: Invalid declaration 'x'"]
+
+
+def test_parse_declarations():
+    assert CSSParser("").parse_declarations(" color: red ; margin:0;; ") == {"color": "red", "margin": "0"}
+
+
+def test_fast_path_matches_full_scan():
+    # A comment after each '{' sends every rule through the full scanner
+    rng = random.Random(3)
+    selectors = ["a", ".b", "div > p", "a:not(.x)", "[d='1,2']", "x, y", "p::before", "a(b", "a["]
+    values = ["1px", "f(g(h), i)", "url(a;b)", "rgb(1 2 3 / 50%)", "calc((1px + 2px) * 3)",
+              "a/b", "x)", "(", "a[b]", "f(g(h(i;j)))", ""]
+    props = ["color", "margin", "--v", "", "x y"]
+    for _ in range(3000):
+        css = "".join(
+            "%s { %s }\n" % (rng.choice(selectors), "; ".join(
+                "%s:%s" % (rng.choice(props), rng.choice(values)) for _ in range(rng.randint(0, 4))))
+            for _ in range(rng.randint(1, 4)))
+        rules, errors = parse(css)
+        slow_rules, slow_errors = parse(css.replace("{ ", "{/**/ "))
+        assert rules == slow_rules, css
+        # The comment moves columns; the messages must still agree
+        assert [e.split(": ", 1)[1] for e in errors] == [e.split(": ", 1)[1] for e in slow_errors], css
@@ -0,0 +1,192 @@
+# test_grid_placement.py
+"""
+Tests for grid_placement: random containers checked against a cell-by-cell
+transcription of the auto-placement algorithm (CSS Grid Level 1, section
+8.5), plus line resolution examples.
+
+    python -m pytest -q test_grid_placement.py
+"""
+import random
+
+import pytest
+
+from grid_areas import parse_template_areas
+from grid_placement import is_grid_item, place_grid_items
+from grid_tracks import parse_track_list
+
+
+def reference_placement(items, explicit_columns, dense):
+    """
+    Section 8.5 for row flow, one cell at a time.
+
+    items: (row, row_span, column, column_span) per item, row/column None
+    when auto. Returns (row, column, row_span, column_span) per item.
+    """
+    occupied = set()
+    placements = [None] * len(items)
+
+    def fits(row, row_span, column, column_span):
+        return not any((r, c) in occupied for r in range(row, row + row_span)
+                       for c in range(column, column + column_span))
+
+    def occupy(index, row, row_span, column, column_span):
+        occupied.update((r, c) for r in range(row, row + row_span)
+                        for c in range(column, column + column_span))
+        placements[index] = (row, column, row_span, column_span)
+
+    # 1. Anything not auto-positioned
+    for index, (row, row_span, column, column_span) in enumerate(items):
+        if row is not None and column is not None:
+            occupy(index, row, row_span, column, column_span)
+
+    # 2. Items locked to a given row
+    row_cursors = {}
+    for index, (row, row_span, column, column_span) in enumerate(items):
+        if row is not None and column is None:
+            column = 1 if dense else row_cursors.get(row, 1)
+            while not fits(row, row_span, column, column_span):
+                column += 1
+            occupy(index, row, row_span, column, column_span)
+            row_cursors[row] = column + column_span
+
+    # 3. Columns in the implicit grid
+    column_count = explicit_columns
+    for index, (row, row_span, column, column_span) in enumerate(items):
+        if placements[index] is not None:
+            _, column, _, column_span = placements[index]
+            column_count = max(column_count, column + column_span - 1)
+        elif column is not None:
+            column_count = max(column_count, column + column_span - 1)
+        else:
+            column_count = max(column_count, column_span)
+
+    # 4. Remaining items
+    cursor_row, cursor_column = 1, 1
+    for index, (row, row_span, column, column_span) in enumerate(items):
+        if placements[index] is not None:
+            continue
+        if column is not None:
+            if dense:
+                row = 1
+            else:
+                if column < cursor_column:
+                    cursor_row += 1
+                row = cursor_row
+            while not fits(row, row_span, column, column_span):
+                row += 1
+            if not dense:
+                cursor_row, cursor_column = row, column
+        else:
+            row, column = (1, 1) if dense else (cursor_row, cursor_column)
+            while True:
+                if column + column_span - 1 > column_count:
+                    row, column = row + 1, 1
+                elif fits(row, row_span, column, column_span):
+                    break
+                else:
+                    column += 1
+            if not dense:
+                cursor_row, cursor_column = row, column
+        occupy(index, row, row_span, column, column_span)
+    return placements
+
+
+def random_axis(rng):
+    """(start value, end value, expected line or None, expected span)"""
+    span = rng.randint(1, 3)
+    line = rng.randint(1, 5)
+    return rng.choice([
+        ("auto", "auto", None, 1),
+        (f"span {span}", "auto", None, span),
+        ("auto", f"span {span}", None, span),
+        (str(line), "auto", line, 1),
+        (str(line), f"span {span}", line, span),
+        (str(line), str(line + span), line, span),
+    ])
+
+
+def track_list(count):
+    return parse_track_list(" ".join(["1fr"] * count)) if count else None
+
+
+@pytest.mark.parametrize("auto_flow", ["row", "row dense", "column", "column dense"])
+def test_matches_reference(auto_flow):
+    rng = random.Random(auto_flow)
+    column_flow = auto_flow.startswith("column")
+    dense = auto_flow.endswith("dense")
+    for _ in range(2000):
+        explicit_rows, explicit_columns = rng.randint(0, 4), rng.randint(0, 4)
+        items, expected_items = [], []
+        for _ in range(rng.randint(1, 12)):
+            row_start, row_end, row, row_span = random_axis(rng)
+            column_start, column_end, column, column_span = random_axis(rng)
+            items.append((row_start, row_end, column_start, column_end))
+            expected_items.append((row, row_span, column, column_span))
+
+        placements = place_grid_items(items, track_list(explicit_columns),
+                                      track_list(explicit_rows), auto_flow)
+        if column_flow:
+            # Column flow is row flow with the axes swapped
+            transposed = [(column, column_span, row, row_span)
+                          for row, row_span, column, column_span in expected_items]
+            expected = [(row, column, row_span, column_span) for column, row, column_span, row_span
+                        in reference_placement(transposed, explicit_rows, dense)]
+        else:
+            expected = reference_placement(expected_items, explicit_columns, dense)
+        assert placements == expected, (items, explicit_rows, explicit_columns)
+
+
+def test_auto_placed_items_never_overlap():
+    # Only items definite on both axes may overlap (each other)
+    rng = random.Random(8)
+    for _ in range(500):
+        axes = [(random_axis(rng), random_axis(rng)) for _ in range(rng.randint(1, 20))]
+        items = [(*row[:2], *column[:2]) for row, column in axes]
+        auto_flow = rng.choice(["row", "row dense", "column", "column dense"])
+        areas = [{(r, c) for r in range(row, row + row_span) for c in range(column, column + column_span)}
+                 for row, column, row_span, column_span
+                 in place_grid_items(items, track_list(3), None, auto_flow)]
+        for index, (row, column) in enumerate(axes):
+            if row[2] is None or column[2] is None:
+                others = set().union(*areas[:index], *areas[index + 1:])
+                assert not areas[index] & others
+
+
+def test_sparse_and_dense_backfill():
+    items = [("auto", "auto", "span 2", "auto"), ("auto", "auto", "span 2", "auto"),
+             ("auto", "auto", "auto", "auto")]
+    # The second wide item does not fit after the first, leaving a hole
+    assert place_grid_items(items, track_list(3)) == [(1, 1, 1, 2), (2, 1, 1, 2), (2, 3, 1, 1)]
+    assert place_grid_items(items, track_list(3), auto_flow="row dense") == \
+        [(1, 1, 1, 2), (2, 1, 1, 2), (1, 3, 1, 1)]
+
+
+def test_negative_and_named_lines():
+    columns = parse_track_list("[full-start] 1fr [main-start] 2fr [main-end] 1fr [full-end]")
+    items = [("1", "auto", "-1", "-2"),
+             ("2", "auto", "main", "auto"),
+             ("3", "auto", "full-start", "full-end"),
+             ("4", "auto", "span main-end", "-1")]
+    assert place_grid_items(items, columns) == \
+        [(1, 3, 1, 1), (2, 2, 1, 1), (3, 1, 1, 3), (4, 3, 1, 1)]
+
+
+def test_area_names_resolve_to_edges():
+    areas = parse_template_areas('"head head" "side main"')
+    items = [("head", "head", "head", "head"), ("main", "auto", "main", "auto"),
+             ("auto", "auto", "auto", "auto")]
+    assert place_grid_items(items, areas=areas) == [(1, 1, 1, 2), (2, 2, 1, 1), (2, 1, 1, 1)]
+
+
+def test_lines_are_clamped_and_shifted():
+    items = [("-10", "auto", "auto", "auto"), ("99999", "auto", "1", "auto")]
+    placements = place_grid_items(items, track_list(2), track_list(2))
+    assert placements[0][0] == 1
+    assert placements[1][0] == 10000
+
+
+def test_is_grid_item():
+    assert is_grid_item({"name": "a", "tag": "div"})
+    assert not is_grid_item({"proxy": "linegap"})
+    assert not is_grid_item({"name": "a", "proxy": "linegap"})
+    assert not is_grid_item("text")
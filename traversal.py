@@ -0,0 +1,154 @@
+# traversal.py
+import json
+from json.encoder import encode_basestring_ascii
+
+_LEAVE = object()
+
+
+def walk(root, enter, leave=None, state=None):
+    """
+    Depth-first traversal with an explicit stack, so tree depth is not bound
+    by the interpreter's recursion limit.
+
+    Nodes are visited in the same order as a recursive pre-order walk:
+    - enter(node, state) runs when a node is reached and returns
+      (children, child_state): the children to descend into, in order, and
+      the state each of them receives. Return (None, None) to skip them.
+    - leave(node, child_state), if given, runs after all of the node's
+      descendants have been visited.
+    """
+    stack = [(root, state)]
+    pop = stack.pop
+    push = stack.append
+    extend = stack.extend
+    while stack:
+        node, node_state = pop()
+        if node is _LEAVE:
+            leave(*node_state)
+            continue
+        children, child_state = enter(node, node_state)
+        if leave is not None:
+            push((_LEAVE, (node, child_state)))
+        if children:
+            extend([(child, child_state) for child in reversed(children)])
+
+
+def copy_json(value):
+    """
+    Deep copy of a JSON-like value with an explicit stack: dicts and lists
+    are copied at any depth, other values (JSON scalars) are shared.
+    """
+    if not isinstance(value, (dict, list)):
+        return value
+    result = {} if isinstance(value, dict) else []
+    stack = [(value, result)]
+    pop = stack.pop
+    push = stack.append
+    while stack:
+        source, target = pop()
+        items = source.items() if isinstance(source, dict) else enumerate(source)
+        for key, item in items:
+            if isinstance(item, (dict, list)):
+                copied = {} if isinstance(item, dict) else []
+                push((item, copied))
+                item = copied
+            if isinstance(target, dict):
+                target[key] = item
+            else:
+                target.append(item)
+    return result
+
+
+def dumps_json(value, indent=None):
+    """
+    json.dumps(value, indent=indent) for values of any depth. The json
+    module's encoders recurse, so a value too deep for them is encoded again
+    with an explicit stack, giving the same text.
+    """
+    try:
+        return json.dumps(value, indent=indent)
+    except RecursionError:
+        return "".join(_iter_json(value, indent))
+
+
+def dump_json(value, fp, indent=None):
+    """json.dump(value, fp, indent=indent) for values of any depth"""
+    fp.write(dumps_json(value, indent))
+
+
+def _iter_json(value, indent):
+    """Chunks of json.dumps(value, indent=indent), without recursion"""
+    if indent is not None and not isinstance(indent, str):
+        indent = " " * indent
+    separator = ", " if indent is None else ","
+    stack = []       # (items iterator, is a dict, closing text) per open container
+    open_ids = set()
+    level = 0
+    while True:
+        # Encode value; a non-empty container opens and its first item
+        # becomes the next value
+        if isinstance(value, (list, tuple, dict)) and value:
+            if id(value) in open_ids:
+                raise ValueError("Circular reference detected")
+            is_dict = isinstance(value, dict)
+            level += 1
+            line = "" if indent is None else "\n" + indent * level
+            closing = ("" if indent is None else "\n" + indent * (level - 1)) + ("}" if is_dict else "]")
+            items = iter(value.items() if is_dict else value)
+            stack.append((items, is_dict, closing, id(value)))
+            open_ids.add(id(value))
+            value = next(items)
+            if is_dict:
+                yield "{" + line + _json_key(value[0]) + ": "
+                value = value[1]
+            else:
+                yield "[" + line
+            continue
+        if isinstance(value, (list, tuple)):
+            yield "[]"
+        elif isinstance(value, dict):
+            yield "{}"
+        else:
+            yield _json_scalar(value)
+
+        # Move on to the next item, closing finished containers
+        while stack:
+            items, is_dict, closing, container_id = stack[-1]
+            item = next(items, _LEAVE)
+            if item is not _LEAVE:
+                line = "" if indent is None else "\n" + indent * level
+                if is_dict:
+                    yield separator + line + _json_key(item[0]) + ": "
+                    value = item[1]
+                else:
+                    yield separator + line
+                    value = item
+                break
+            stack.pop()
+            open_ids.discard(container_id)
+            level -= 1
+            yield closing
+        else:
+            return
+
+
+def _json_scalar(value):
+    if isinstance(value, str):
+        return encode_basestring_ascii(value)
+    if value is None:
+        return "null"
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if isinstance(value, (int, float)):
+        return json.dumps(value)
+    raise TypeError(f"Object of type {value.__class__.__name__} is not JSON serializable")
+
+
+def _json_key(key):
+    if isinstance(key, str):
+        return encode_basestring_ascii(key)
+    if isinstance(key, (int, float, bool)) or key is None:
+        return '"' + _json_scalar(key) + '"'
+    raise TypeError(f"keys must be str, int, float, bool or None, not {key.__class__.__name__}")
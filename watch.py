@@ -0,0 +1,338 @@
+# watch.py
+"""
+Watch an HTML/CSS pair and keep its grid JSON output up to date.
+
+The parsed DOM, the compiled stylesheet and the unprocessed to_json() tree
+stay in memory between edits:
+- a CSS change re-resolves styles only on nodes matched by rules that were
+  added, removed or changed, and re-runs the grid passes only on the grid
+  containers holding those nodes;
+- an HTML change re-parses the document and reuses the compiled stylesheet,
+  and the grid passes re-run only on grid containers whose unprocessed
+  entries changed; this needs a stable --names scheme, since random auto_
+  names differ on every parse.
+
+With --patch-file, every update also appends a line holding the
+output_patch patch from the previous output to the new one, so consumers
+can follow the document without reloading it; use a stable --names scheme
+so unchanged nodes match.
+
+    python watch.py software.html software.css output.json
+    python watch.py software.html software.css output.json --names path --patch-file output.patches
+"""
+import argparse
+import hashlib
+import os
+import time
+
+from dom_linegap import EMPTY_MAPPING, CompiledStylesheet, CSSParser, HTMLParser
+from grid_detector import is_grid_container, process_grid_containers
+from node_names import NAMING_SCHEMES, make_namer
+from output_patch import diff_outputs
+from traversal import copy_json, dump_json, dumps_json, walk
+
+
+class WatchSession:
+    """
+    In-memory conversion state for one HTML/CSS pair.
+
+    Only grid containers with no container above them are touched by
+    process_grid_containers, and each is processed independently of the rest
+    of the tree. The session keeps those "units" processed separately, so an
+    edit only re-runs the units it reaches and the output is reassembled
+    from the pristine tree plus the cached units.
+
+    names is the naming scheme for auto_ names (see node_names); with
+    "path" or "content", an HTML edit leaves the names of untouched nodes
+    as they were.
+    """
+
+    def __init__(self, html_file, css_file, output_file, names=None, patch_file=None):
+        self.html_file = html_file
+        self.css_file = css_file
+        self.output_file = output_file
+        self.names = names
+        self.patch_file = patch_file
+        self.written = None        # last output written, the base of the next patch
+        self.css_rules = []
+        self.stylesheet = None
+        self.errors = []
+        self.dom = None
+        self.body = None
+        self.raw = None            # body.to_json() before grid processing
+        self._entries = {}         # HTMLNode -> (JSON entry, dict holding its grid/style)
+        self._units = {}           # id(unit root entry) -> (unit root, processed copy)
+
+    def load(self):
+        """Run the full conversion and write the output"""
+        self._load_css()
+        self._load_html()
+        self._process_units(None)
+        self.write_output()
+
+    def css_changed(self):
+        """Re-resolve styles for the nodes reached by changed rules"""
+        old_rules = self.css_rules
+        self._load_css()
+        if self.body is None:
+            return self.write_output()
+
+        changed = _changed_rules(old_rules, self.css_rules)
+        if changed is None:
+            affected = [node for node in self._entries]
+        else:
+            affected = self._matching_nodes(CompiledStylesheet(changed))
+
+        for node in affected:
+            node.styles = EMPTY_MAPPING
+            node._enter_styles(self.stylesheet)
+        # Children a checkbox/radio label drops have no entry in the output
+        affected = [node for node in affected if node in self._entries]
+        for node in affected:
+            grid, style = node._split_styles()
+            holder = self._entries[node][1]
+            holder["grid"] = grid
+            holder["style"] = style
+
+        self._process_units(affected)
+        self.write_output()
+        return affected
+
+    def html_changed(self):
+        """
+        Re-parse the document, reusing the compiled stylesheet and the
+        processed units whose unprocessed entries are unchanged
+        """
+        previous = {_unit_digest(root): processed for root, processed in self._units.values()}
+        self._load_html()
+        self._process_units(None, previous)
+        self.write_output()
+
+    def _load_css(self):
+        with open(self.css_file, "r", encoding="utf-8") as f:
+            self.css_rules = CSSParser(f.read()).parse_rules()
+        self.stylesheet = CompiledStylesheet(self.css_rules)
+
+    def _load_html(self):
+        with open(self.html_file, "r", encoding="utf-8") as f:
+            html_parser = HTMLParser(f)
+            self.dom = html_parser.parse()
+        self.errors = html_parser.errors
+        self.dom.apply_styles(self.stylesheet)
+        self.body = next((child for child in self.dom.children if child.tag == "body"), None)
+        self._units = {}
+        self._entries = {}
+        self.raw = self._build_raw() if self.body else None
+
+    def _build_raw(self):
+        """body.to_json(), recording which entry belongs to which node"""
+        entries = self._entries
+        result = []
+
+        def _enter(node, state):
+            components, leading = state[0], state[1]
+            children, child_state = node._enter_json(state)
+            entry = components[0] if leading else components[-1 - len(node.proxy)]
+            # A checkbox/radio label becomes a wrapper whose first component
+            # (until the input is inserted ahead of it) is the label itself
+            holder = child_state[0][0] if child_state[1] else entry
+            entries[node] = (entry, holder)
+            return children, child_state
+
+        walk(self.body, _enter, state=(result, True, make_namer(self.names)))
+        return result[0]
+
+    def _matching_nodes(self, changed):
+        """Nodes matched by any rule of the changed-rules stylesheet"""
+        matched = []
+
+        def _enter(node, state):
+            for rule in changed.candidates(node):
+                if node._matches_parts(rule.parts):
+                    matched.append(node)
+                    break
+            return node.children, None
+
+        walk(self.body, _enter)
+        return matched
+
+    def _unit_roots(self):
+        """Outermost grid containers of the unprocessed tree"""
+        roots = []
+
+        def _enter(entry, state):
+            if not isinstance(entry, dict):
+                return None, None
+            if is_grid_container(entry):
+                roots.append(entry)
+                return None, None
+            return entry.get("component", []), None
+
+        walk(self.raw, _enter)
+        return roots
+
+    def _unit_of(self, node):
+        """Outermost grid container entry whose subtree holds node's entry"""
+        chain = []
+        while node is not None and node in self._entries:
+            chain.append(node)
+            node = node.parent
+        for ancestor in reversed(chain[1:]):
+            entry = self._entries[ancestor][0]
+            if is_grid_container(entry):
+                return entry
+        for entry in self._entries[chain[0]]:
+            if is_grid_container(entry):
+                return entry
+        return None
+
+    def _process_units(self, affected, previous=None):
+        """
+        Grid-process every unit that is new or holds an affected node
+        (all of them when affected is None); reuse the rest. previous maps
+        _unit_digest() of earlier unit roots to their processed copies; a
+        unit with the same digest takes its copy instead of being processed.
+        """
+        dirty = None
+        if affected is not None:
+            dirty = {id(unit) for unit in map(self._unit_of, affected) if unit is not None}
+
+        units = {}
+        if self.raw is not None:
+            for root in self._unit_roots():
+                cached = self._units.get(id(root))
+                if dirty is None or id(root) in dirty or cached is None or cached[0] is not root:
+                    processed = previous.pop(_unit_digest(root), None) if previous else None
+                    if processed is None:
+                        processed = process_grid_containers(copy_json(root))
+                    cached = (root, processed)
+                units[id(root)] = cached
+        self._units = units
+
+    def output(self):
+        """The processed document, assembled from the raw tree and units"""
+        if self.body is None:
+            return {"error": "No <body> tag found"}
+        units = self._units
+        result = []
+
+        def _enter(entry, components):
+            unit = units.get(id(entry))
+            if unit is not None and unit[0] is entry:
+                components.append(unit[1])
+                return None, None
+            if not isinstance(entry, dict) or "component" not in entry:
+                components.append(entry)
+                return None, None
+            entry = dict(entry)
+            children = entry["component"]
+            entry["component"] = []
+            components.append(entry)
+            return children, entry["component"]
+
+        walk(self.raw, _enter, state=result)
+        return result[0]
+
+    def write_output(self):
+        output = self.output()
+        with open(self.output_file, "w", encoding="utf-8") as f:
+            dump_json(output, f, indent=2)
+        if self.patch_file and self.written is not None:
+            with open(self.patch_file, "a", encoding="utf-8") as f:
+                f.write(dumps_json(diff_outputs(self.written, output)) + "\n")
+        # Units are replaced, never modified, so the output can be kept as is
+        self.written = output
+
+
+def _unit_digest(root):
+    """Digest of a unit root's unprocessed entry, which alone decides its processed copy"""
+    return hashlib.sha256(dumps_json(root).encode("utf-8")).digest()
+
+
+def _changed_rules(old_rules, new_rules):
+    """
+    Rules whose effect differs between two CSSParser.parse_rules() results:
+    added, removed or changed rules (removed ones with their old
+    declarations), as (selector, properties) pairs. A rule is told apart from
+    others with the same selector by their order. Returns None when common
+    rules were reordered, since that can change the outcome on any node.
+    """
+    old_keyed = _keyed_rules(old_rules)
+    new_keyed = _keyed_rules(new_rules)
+    common_old = [key for key in old_keyed if key in new_keyed]
+    common_new = [key for key in new_keyed if key in old_keyed]
+    if common_old != common_new:
+        return None
+
+    changed = []
+    for key, properties in new_keyed.items():
+        if old_keyed.get(key) != properties:
+            changed.append((key[0], properties))
+    for key, properties in old_keyed.items():
+        if key not in new_keyed:
+            changed.append((key[0], properties))
+    return changed
+
+
+def _keyed_rules(rules):
+    """{(selector, occurrence of the selector): properties}, in rule order"""
+    keyed = {}
+    occurrences = {}
+    for selector, properties in rules:
+        occurrence = occurrences.get(selector, 0)
+        occurrences[selector] = occurrence + 1
+        keyed[(selector, occurrence)] = properties
+    return keyed
+
+
+def watch(html_file, css_file, output_file, interval=0.5, names=None, patch_file=None):
+    """Poll both files and update output_file whenever one of them changes"""
+    session = WatchSession(html_file, css_file, output_file, names, patch_file)
+    session.load()
+    print(f"Generated JSON output at {output_file}")
+    mtimes = (os.path.getmtime(html_file), os.path.getmtime(css_file))
+
+    while True:
+        time.sleep(interval)
+        try:
+            current = (os.path.getmtime(html_file), os.path.getmtime(css_file))
+        except OSError:
+            continue  # file is being replaced
+        if current == mtimes:
+            continue
+        html_changed, css_changed = current[0] != mtimes[0], current[1] != mtimes[1]
+        mtimes = current
+        start = time.perf_counter()
+        try:
+            if css_changed:
+                session.css_changed()
+            if html_changed:
+                session.html_changed()
+        except Exception as e:
+            print(f"Error: {e}")
+            continue
+        changed = " and ".join(name for name, flag in
+                               (("HTML", html_changed), ("CSS", css_changed)) if flag)
+        print(f"{changed} changed, updated {output_file} in "
+              f"{(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild grid JSON when HTML or CSS changes")
+    parser.add_argument("html_file")
+    parser.add_argument("css_file")
+    parser.add_argument("output_file")
+    parser.add_argument("--interval", type=float, default=0.5, help="Polling interval in seconds")
+    parser.add_argument("--names", choices=NAMING_SCHEMES, default="random",
+                        help="Naming scheme for nodes without an id, value or name")
+    parser.add_argument("--patch-file", help="Append a patch against the previous output per update")
+    args = parser.parse_args(argv)
+    try:
+        watch(args.html_file, args.css_file, args.output_file, args.interval, args.names,
+              args.patch_file)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()